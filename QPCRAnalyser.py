@@ -1,13 +1,14 @@
 import numpy as np
-import matplotlib.pyplot as plt
 import pyqtgraph as pg
 from pyqtgraph.Qt import QtGui, QtCore, QtWidgets
 from matplotlib.backends.backend_qt4agg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.backends.backend_qt4agg import NavigationToolbar2QT as NavigationToolbar
 from matplotlib.figure import Figure
-from scipy import stats
-import time
-import os
+from QPCRPlate import standardCurve, deltaGDeltaH
+from QPCRFiles import readPlate, PlateCache
+from QPCRSession import Session
+from QPCRExport import exportPetersFormat, exportPlatesCsv, savePlates
+from QPCRRender import drawRaw, drawLog, drawCurve, packCurves
 
 class QPCRAnalyser(QtGui.QMainWindow):
     ''' class for analysing QPCR data for C period determination '''
@@ -17,15 +18,38 @@ class QPCRAnalyser(QtGui.QMainWindow):
         Constructor for the analyser GUI
         '''
         #Start with essential data structures
-        self.data = {"Files":[] ,"Cells":[], "Xs":[], "Ys":[], "LogXs":[],"LogYs":[],
-                    "Visible":[],"RawCurves":[],"LogCurves":[],"Hs":[],"HCurves":[],"RawHCurves":[], "Alphas":[],"AlphaCurves":[]}
+        #Numeric data lives in self.plate, plot items are only kept for shown wells
+        self.data = {"Files":[] ,"Cells":[], "Visible":[],"RawCurves":{},"LogCurves":{},"Hs":[],"HCurves":{},
+                    "Alphas":[],"AlphaFits":[],"AlphaCurves":{}}
+        self.plate = None
+        self.plateCache = PlateCache()
+        #Every loaded run, self.plate is a flat view of it. Plate buttons act
+        #on activeRun only, or on every run when it is None
+        self.session = Session()
+        self.activeRun = None
+        #Well name -> rows of the plate, and colour slot of each shown row
+        self.wellRows = {}
+        self.colourSlots = {}
+        self.paletteSize = 8
+        #Overlay mode packs the shown wells into one line item per colour
+        self.overlayMode = False
+        self.overlayColours = 8
+        self.overlayItems = {}
+        self.overlayTimer = None
         self.threshold  = None
         self.cX = None
         self.cY = None
         self.cFitX = None
         self.cFitY = None
         self.ctype = "Callibration"
+        #LRE region, scatter and fit of each well, and wells waiting for a refit
         self.LREZones = None
+        self.LREItems = {}
+        self.LREPending = set()
+        self.LRETimer = None
+        self.bestWindowFits = False
+        #Analyse the plate with each well's fitted linear baseline removed
+        self.baselineSubtraction = False
         self.concentrations =[1.0,0.2,0.04,0.008,0.0016]
         self.distances = [0.4603,0.02516,0.963,0.0,1.0]
         #Set global settings for plots
@@ -58,7 +82,7 @@ class QPCRAnalyser(QtGui.QMainWindow):
         #Create action for opening files
         openFile = QtGui.QAction("Load file", self)
         openFile.setShortcut("Ctrl+O")
-        openFile.setStatusTip('Load QPCR .txt file')
+        openFile.setStatusTip('Load QPCR .txt or .lc96p file')
         openFile.triggered.connect(self.onOpenFile)
         #Add open file action to file menu
         fileMenu.addAction(openFile)
@@ -69,6 +93,12 @@ class QPCRAnalyser(QtGui.QMainWindow):
         setThresh.setStatusTip('set threshold for log data')
         setThresh.triggered.connect(lambda : self.onSelectThresh(None))
         analysisMenu.addAction(setThresh)
+        #Add automatic threshold selection
+        autoThresh = QtGui.QAction("Auto threshold",self)
+        autoThresh.setShortcut("shift+A")
+        autoThresh.setStatusTip('Choose the threshold minimising an objective over the shown wells')
+        autoThresh.triggered.connect(self.onAutoThreshold)
+        analysisMenu.addAction(autoThresh)
         #Add distance calc
         addDistance = QtGui.QAction("Add distance info",self)
         addDistance.setShortcut("Ctrl+d")
@@ -102,6 +132,28 @@ class QPCRAnalyser(QtGui.QMainWindow):
         DGDHThresholdSweep.triggered.connect(self.onDeltaHDeltaGSweep)
         analysisMenu.addAction(DGDHThresholdSweep)
 
+        #Toggle between fixed and best r squared log linear fit windows
+        bestWindow = QtGui.QAction("Best log linear fit window",self)
+        bestWindow.setCheckable(True)
+        bestWindow.setStatusTip('Fit each well over the window around its ct with the best r squared')
+        bestWindow.toggled.connect(self.onBestWindowToggle)
+        analysisMenu.addAction(bestWindow)
+
+        #Toggle drawing the shown wells as a few packed overlay items
+        overlay = QtGui.QAction("Overlay mode",self)
+        overlay.setCheckable(True)
+        overlay.setShortcut("shift+O")
+        overlay.setStatusTip('Draw all shown wells as one curve per colour for large overlays')
+        overlay.toggled.connect(self.onOverlayToggle)
+        analysisMenu.addAction(overlay)
+
+        #Toggle subtracting a fitted linear baseline from every well
+        baseline = QtGui.QAction("Subtract baseline",self)
+        baseline.setCheckable(True)
+        baseline.setShortcut("shift+B")
+        baseline.setStatusTip('Detect each well\'s baseline cycles and subtract a line fitted to them')
+        baseline.toggled.connect(self.onBaselineToggle)
+        analysisMenu.addAction(baseline)
 
 
         #Add plot saving
@@ -116,14 +168,20 @@ class QPCRAnalyser(QtGui.QMainWindow):
         savePetersFormat.setStatusTip('Save selected to peters format')
         savePetersFormat.triggered.connect(self.saveToPetersFormat)
         fileMenu.addAction(savePetersFormat)
+        #Add export of the shown wells as csv or binary columns
+        exportData = QtGui.QAction("Export data", self)
+        exportData.setShortcut("Ctrl+E")
+        exportData.setStatusTip('Export selected to a long format csv or .npz file')
+        exportData.triggered.connect(self.onExportData)
+        fileMenu.addAction(exportData)
 
     def onOpenFile(self):
         '''
-        Opens file dialoug and loads data if .txt file is selected
+        Opens file dialoug and loads data if .txt or .lc96p file is selected
         '''
         #Launch file selection dialoug
         filePath, filter = QtGui.QFileDialog.getOpenFileName(self,'Open File',
-        './',filter="*.txt")
+        './',filter="*.txt *.lc96p")
         #If file selected start reading file
         if filePath != '':
             self.readQPCRFile(filePath)
@@ -131,40 +189,49 @@ class QPCRAnalyser(QtGui.QMainWindow):
 
     def readQPCRFile(self,filePath):
         '''
-        Load QPCR data from chosen .txt file
-        '''
-        #Get filename
-        head, tail = os.path.split(filePath)
-        self.data["Files"].append(tail)
-        #Load in utf16 format
-        f = open(filePath,encoding='utf-16-le')
-        #Extract data
-        x = []
-        for i,line in enumerate(f.readlines()):
-            splitLine = line.rstrip().split("\t")
-            y = []
-            for j,item in enumerate(splitLine):
-                if i == 0 and j > 0:
-                    x.append(j)
-                if i > 0:
-                    if j == 0:
-                        self.data["Cells"].append(item)
-                    else:
-                        y.append(float(item))
-            if i > 0:
-                self.data["Ys"].append(y)
-                self.data["Xs"].append(x)
-                self.data["Visible"].append(False)
-                self.data["RawCurves"].append(pg.PlotDataItem(x,y,symbolSize=7.0,symbol='o',symbolPen=None))
-                self.data["Hs"].append(-1)
-                self.data["HCurves"].append(pg.InfiniteLine())
-                self.data["Alphas"].append(-1)
-                self.data["AlphaCurves"].append(pg.PlotCurveItem([],[]))
-                logX = [x[i] for i in range(len(x)) if y[i] >0]
-                logY = [np.log2(y[i]) for i in range(len(x)) if y[i] >0]
-                self.data["LogXs"].append(logX)
-                self.data["LogYs"].append(logY)
-                self.data["LogCurves"].append(pg.PlotDataItem(logX,logY,symbol='o',symbolSize=5,symbolPen=None))
+        Load QPCR data from chosen .txt or .lc96p file
+        '''
+        #Parse into the session as a new run, the GUI only keeps views of it
+        plate = readPlate(filePath,cache=self.plateCache)
+        self.data["Files"].append(plate.name)
+        oldWidth = self.session.data.shape[1]
+        old = {key:self.data[key] for key in ["Hs","Alphas","AlphaFits"]}
+        self.session.addPlate(plate)
+        self.plate = self.sessionPlate()
+        #Rows are run*width + well so they move if the new run is wider
+        width = self.session.data.shape[1]
+        self.wellRows = {}
+        for key,default in [("Cells",""),("Visible",False),("Hs",-1),("Alphas",-1),("AlphaFits",None)]:
+            self.data[key] = [default]*len(self.plate)
+        for i in range(len(self.plate)):
+            run, row = divmod(i,width)
+            if row >= len(self.session.wells[run]):
+                continue
+            self.wellRows.setdefault(self.plate.wells[i],[]).append(i)
+            self.data["Cells"][i] = self.plate.wells[i] + " " + self.plate.dyes[i]
+            if len(self.session) > 1:
+                self.data["Cells"][i] += " [{0}]".format(run+1)
+            if run < len(self.session) - 1:
+                for key in old:
+                    self.data[key][i] = old[key][run*oldWidth + row]
+        #Plot items belong to the old plots which setUpUI replaces
+        for key in ["RawCurves","LogCurves","HCurves","AlphaCurves"]:
+            self.data[key] = {}
+        self.overlayItems = {}
+        self.data["Visible"] = [False]*len(self.data["Visible"])
+        self.colourSlots = {}
+        self.LREZones = None
+        self.LREItems = {}
+        self.activeRun = None
+
+    def sessionPlate(self):
+        '''
+        Flat plate of every run, baseline subtracted if that is switched on
+        '''
+        plate = self.session.flatPlate()
+        if self.baselineSubtraction:
+            plate = plate.subtractBaseline()
+        return plate
 
     def setUpUI(self):
         '''
@@ -201,6 +268,9 @@ class QPCRAnalyser(QtGui.QMainWindow):
         self.cPlot.showGrid(x=True,y=True)
         self.cPlot.addLegend()
         mainLayout.addWidget(self.cPlot,1,1)
+        #Overlays are clipped to the view so follow pans and zooms
+        self.rawPlot.sigXRangeChanged.connect(self.onOverlayViewChanged)
+        self.logPlot.sigXRangeChanged.connect(self.onOverlayViewChanged)
 
         #Add layout to main window
         mainWidget.setLayout(mainLayout)
@@ -215,13 +285,16 @@ class QPCRAnalyser(QtGui.QMainWindow):
         for i,column in enumerate(columns):
             headerBtn = QtGui.QPushButton(column)
             headerBtn.setSizePolicy(QtGui.QSizePolicy.Ignored,QtGui.QSizePolicy.Preferred)
+            headerBtn.clicked.connect(lambda checked=False,c=column: self.onHeaderPress([r+c for r in rows]))
             plateLayout.addWidget(headerBtn,0,i+1)
         #Create row headers
         for i,row in enumerate(rows):
             headerBtn = QtGui.QPushButton(row)
             headerBtn.setSizePolicy(QtGui.QSizePolicy.Ignored,QtGui.QSizePolicy.Preferred)
+            headerBtn.clicked.connect(lambda checked=False,r=row: self.onHeaderPress([r+c for c in columns]))
             plateLayout.addWidget(headerBtn,i+1,0)
         #Create cell buttons
+        self.cellButtons = {}
         for i in range(1,len(rows)+1):
             for j in range(1,len(columns)+1):
                 btn = QtGui.QPushButton(rows[i-1]+columns[j-1])
@@ -229,6 +302,12 @@ class QPCRAnalyser(QtGui.QMainWindow):
                 btn.setCheckable(True)
                 btn.clicked.connect(self.onCellPress)
                 plateLayout.addWidget(btn,i,j)
+                self.cellButtons[rows[i-1]+columns[j-1]] = btn
+        #Choose the run the plate buttons act on
+        self.runBox = QtGui.QComboBox()
+        self.runBox.addItems(["All runs"] + ["{0}: {1}".format(k+1,name) for k,name in enumerate(self.session.names)])
+        self.runBox.currentIndexChanged.connect(self.onRunChanged)
+        plateLayout.addWidget(self.runBox,len(rows)+1,0,1,len(columns)+1)
         #Add layout to main layout
         mainLayout.addLayout(plateLayout,1,0)
 
@@ -236,35 +315,218 @@ class QPCRAnalyser(QtGui.QMainWindow):
         self.rubberband = QtGui.QRubberBand(QtGui.QRubberBand.Rectangle, self)
         self.setMouseTracking(True)
 
+    def wellLabel(self,i):
+        '''
+        Well name, tagged with its run number once several runs are loaded
+        '''
+        if len(self.session) > 1:
+            return self.plate.wells[i] + " [{0}]".format(i//self.session.data.shape[1] + 1)
+        return self.plate.wells[i]
+
+    def onRunChanged(self,index):
+        '''
+        Points the plate buttons at another run, clearing what is shown
+        '''
+        for name,btn in self.cellButtons.items():
+            btn.setChecked(False)
+        self.setWellsShown(list(self.wellRows),False)
+        self.activeRun = None if index <= 0 else index - 1
+
     def onCellPress(self):
-        self.rawPlot.plotItem.legend.items = []
-        for i,name in enumerate(self.data["Cells"]):
-            if str(self.sender().text()) == name.split()[0]:
-                if self.sender().isChecked():
-                    self.rawPlot.addItem(self.data["RawCurves"][i])
-                    self.logPlot.addItem(self.data["LogCurves"][i])
-                    if len(self.data["HCurves"]) > 0:
-                        self.logPlot.addItem(self.data["HCurves"][i])
-                    self.data["Visible"][i] = True
-                else:
-                    self.rawPlot.removeItem(self.data["RawCurves"][i])
-                    self.logPlot.removeItem(self.data["LogCurves"][i])
-                    if len(self.data["HCurves"]) > 0:
-                        self.logPlot.removeItem(self.data["HCurves"][i])
-                    self.data["Visible"][i] = False
-        n = np.sum(self.data["Visible"])
-        j= 0
-        for i,curve in enumerate(self.data["RawCurves"]):
-            if self.data["Visible"][i]:
-                self.rawPlot.plotItem.legend.addItem(self.data["RawCurves"][i],self.data["Cells"][i].split(" ")[0])
-                curve.setPen((j,n))
-                curve.setSymbolBrush((j,n))
-                self.data["LogCurves"][i].setPen(None)#(j,n))
-                self.data["LogCurves"][i].setSymbolBrush((j,n))
-                if len(self.data["HCurves"]) > 0:
-                    self.data["HCurves"][i].setPen((j,n))
-                j+=1
-        self.fitExpos()
+        self.setWellsShown([str(self.sender().text())],self.sender().isChecked())
+
+    def onHeaderPress(self,names):
+        '''
+        Toggles a whole row or column, showing it unless it is all shown already
+        '''
+        shown = not all(self.cellButtons[name].isChecked() for name in names)
+        for name in names:
+            self.cellButtons[name].setChecked(shown)
+        self.setWellsShown(names,shown)
+
+    def setWellsShown(self,names,shown):
+        '''
+        Shows or hides the named wells, only touching the wells that changed
+        '''
+        changed = []
+        width = self.session.data.shape[1]
+        for name in names:
+            for i in self.wellRows.get(name,[]):
+                if self.activeRun is not None and i//width != self.activeRun:
+                    continue
+                if self.data["Visible"][i] != shown:
+                    if shown:
+                        self.showWell(i)
+                    else:
+                        self.hideWell(i)
+                    changed.append(i)
+        if self.overlayMode:
+            self.updatePalette()
+        elif self.updatePalette():
+            for i in self.data["RawCurves"]:
+                self.colourWell(i)
+        elif shown:
+            for i in changed:
+                self.colourWell(i)
+        self.fitExpos(changed)
+
+    def updatePalette(self):
+        '''
+        Grows or shrinks the palette when the shown wells no longer suit it.
+        Returns True if every shown well needs recolouring.
+        '''
+        n = len(self.colourSlots)
+        size = self.paletteSize
+        while n > size:
+            size *= 2
+        while size > 8 and n <= size//4:
+            size //= 2
+        if size == self.paletteSize:
+            return False
+        self.paletteSize = size
+        #Pack the slots so they fit in the new palette
+        for slot,i in enumerate(sorted(self.colourSlots)):
+            self.colourSlots[i] = slot
+        return True
+
+    def wellColour(self,i):
+        return (self.colourSlots[i],self.paletteSize)
+
+    def colourWell(self,i):
+        '''
+        Applies a shown well's palette colour to all of its plot items
+        '''
+        colour = self.wellColour(i)
+        rawCurve = self.data["RawCurves"][i]
+        rawCurve.setPen(colour)
+        rawCurve.setSymbolBrush(colour)
+        self.data["LogCurves"][i].setPen(None)
+        self.data["LogCurves"][i].setSymbolBrush(colour)
+        if i in self.data["HCurves"]:
+            self.data["HCurves"][i].setPen(colour)
+        if i in self.data["AlphaCurves"]:
+            self.data["AlphaCurves"][i].setPen(colour)
+
+    def showWell(self,i):
+        '''
+        Creates and adds the plot items of a well when it is first shown
+        '''
+        if self.data["Visible"][i]:
+            return
+        #Take the lowest free colour slot
+        used = set(self.colourSlots.values())
+        self.colourSlots[i] = min(k for k in range(len(used)+1) if k not in used)
+        self.data["Visible"][i] = True
+        if self.overlayMode:
+            return
+        logX, logY = self.plate.logPoints(i)
+        rawCurve = pg.PlotDataItem(self.plate.cycles,self.plate.fluorescence[i],symbolSize=7.0,symbol='o',symbolPen=None)
+        logCurve = pg.PlotDataItem(logX,logY,symbol='o',symbolSize=5,symbolPen=None)
+        self.data["RawCurves"][i] = rawCurve
+        self.data["LogCurves"][i] = logCurve
+        self.rawPlot.addItem(rawCurve)
+        self.logPlot.addItem(logCurve)
+        #Only wells with a crossing get a line
+        if self.data["Hs"][i] != -1:
+            self.addHCurve(i)
+        self.rawPlot.plotItem.legend.addItem(rawCurve,self.wellLabel(i))
+
+    def addHCurve(self,i):
+        '''
+        Adds the vertical line marking a shown well's crossing cycle
+        '''
+        hLine = pg.InfiniteLine()
+        hLine.setValue(self.data["Hs"][i])
+        self.data["HCurves"][i] = hLine
+        self.logPlot.addItem(hLine)
+
+    def hideWell(self,i):
+        '''
+        Removes the plot items of a hidden well and releases them
+        '''
+        if not self.data["Visible"][i]:
+            return
+        self.data["Visible"][i] = False
+        del self.colourSlots[i]
+        if i not in self.data["RawCurves"]:
+            return
+        rawCurve = self.data["RawCurves"].pop(i)
+        self.rawPlot.plotItem.legend.removeItem(rawCurve)
+        self.rawPlot.removeItem(rawCurve)
+        self.logPlot.removeItem(self.data["LogCurves"].pop(i))
+        if i in self.data["HCurves"]:
+            self.logPlot.removeItem(self.data["HCurves"].pop(i))
+        if i in self.data["AlphaCurves"]:
+            alphaCurve = self.data["AlphaCurves"].pop(i)
+            self.logPlot.plotItem.legend.removeItem(alphaCurve)
+            self.logPlot.removeItem(alphaCurve)
+
+    def onOverlayToggle(self,checked):
+        '''
+        Switches between per well plot items and packed overlay items
+        '''
+        if self.overlayTimer is None:
+            #View changes are coalesced to one overlay rebuild per frame
+            self.overlayTimer = QtCore.QTimer()
+            self.overlayTimer.setSingleShot(True)
+            self.overlayTimer.setInterval(16)
+            self.overlayTimer.timeout.connect(self.redrawOverlay)
+        shown = sorted(self.colourSlots)
+        for i in shown:
+            self.hideWell(i)
+        self.overlayMode = checked
+        self.redrawOverlay()
+        for i in shown:
+            self.showWell(i)
+        if not self.overlayMode:
+            self.updatePalette()
+            for i in shown:
+                self.colourWell(i)
+        self.fitExpos(shown)
+
+    def onOverlayViewChanged(self):
+        if self.overlayMode and self.overlayTimer is not None and not self.overlayTimer.isActive():
+            self.overlayTimer.start()
+
+    def redrawOverlay(self):
+        '''
+        Draws the shown wells as a handful of items. Wells sharing a colour are
+        packed end to end into one curve per plot, clipped to the visible cycles,
+        and their crossing lines and fits into one segment item each.
+        '''
+        for plot,item in self.overlayItems.values():
+            plot.removeItem(item)
+        self.overlayItems = {}
+        if not self.overlayMode or len(self.colourSlots) == 0:
+            return
+        rows = np.asarray(sorted(self.colourSlots))
+        groups = np.asarray([self.colourSlots[i] for i in rows]) % self.overlayColours
+        logY = self.plate.logFluorescence
+        hs = np.asarray(self.data["Hs"],dtype=float)
+        for g in np.unique(groups):
+            selected = rows[groups == g]
+            colour = (g,self.overlayColours)
+            for key,plot,ys in (("Raw",self.rawPlot,self.plate.fluorescence),("Log",self.logPlot,logY)):
+                x, y, connect = packCurves(self.plate.cycles,ys[selected],xRange=plot.viewRange()[0],
+                                        maxPoints=max(2,int(plot.width())))
+                item = pg.PlotCurveItem(x,y,connect=connect,pen=colour)
+                plot.addItem(item)
+                self.overlayItems[(key,g)] = (plot,item)
+            crossings = hs[selected][hs[selected] != -1]
+            if len(crossings) > 0:
+                yRange = [np.nanmin(logY[selected]),np.nanmax(logY[selected])]
+                item = pg.PlotCurveItem(np.repeat(crossings,2),np.tile(yRange,len(crossings)),connect="pairs",pen=colour)
+                self.logPlot.addItem(item)
+                self.overlayItems[("H",g)] = (self.logPlot,item)
+            fits = [self.data["AlphaFits"][i] for i in selected if self.data["AlphaFits"][i] is not None]
+            if self.threshold != None and len(fits) > 0:
+                xFit = np.concatenate([f[0] for f in fits])
+                yFit = np.concatenate([f[1] for f in fits])
+                connect = np.ones(len(xFit),dtype=bool)
+                connect[np.cumsum([len(f[0]) for f in fits])-1] = False
+                item = pg.PlotCurveItem(xFit,yFit,connect=connect,pen=colour)
+                self.logPlot.addItem(item)
+                self.overlayItems[("Alpha",g)] = (self.logPlot,item)
 
     def onSelectThresh(self,thresh=None):
         if self.threshold == None:
@@ -290,35 +552,60 @@ class QPCRAnalyser(QtGui.QMainWindow):
             self.rawThreshLine = pg.InfiniteLine(angle=0,pos=self.rawThreshold)
             self.rawPlot.addItem(self.rawThreshLine)
             self.computeHs()
+            self.updateHCurves()
             self.fitExpos()
 
-    def computeHs(self):
-        '''
-        Compute the cycle at which the selected data crosses the threshold value
-        '''
-        for i in range(len(self.data["Xs"])):
-            xs = self.data["LogXs"][i]
-            ys = self.data["LogYs"][i]
-            for j in range(len(xs)):
-                if ys[j] > self.threshold:
-                    #We have crossed threshold get points either side
-                    y2 = ys[j]
-                    y1 = ys[j-1]
-                    x2 = xs[j]
-                    x1 = xs[j-1]
-                    m = (y2-y1)/float((x2-x1))
-                    c = y2 - m*x2
-                    h = (self.threshold-c)/float(m)
-                    self.data["Hs"][i] = h
-                    try:
-                        vline = pg.InfiniteLine(angle=90,pos=h,pen=self.data["LogCurves"][i].opts["symbolBrush"])
-                    except:
-                        vline = pg.InfiniteLine(angle=90,pos=h,pen=self.data["LogCurves"][i].opts["symbolBrush"].color())
-                    self.logPlot.removeItem(self.data["HCurves"][i])
-                    self.data["HCurves"][i] = vline
-                    if self.data["Visible"][i]:
-                        self.logPlot.addItem(vline)
-                    break
+    def onAutoThreshold(self):
+        '''
+        Sets the threshold found by searching for the lowest replicate ct
+        variance, standard curve efficiency error or Delta H Delta G residual
+        of the shown wells
+        '''
+        shown = [i for i in range(len(self.data["Cells"])) if self.data["Visible"][i]]
+        objectives = {"Replicate ct variance":"replicates","Standard curve efficiency":"efficiency",
+                    "Delta H Delta G residual":"distance"}
+        name, ok = QtGui.QInputDialog.getItem(self,"Auto threshold","Minimise",list(objectives),0,False)
+        if not ok or len(shown) < 2:
+            return
+        objective = objectives[str(name)]
+        if objective == "efficiency" and len(shown) != len(self.concentrations):
+            self.statusBar().showMessage("Show one well per concentration ({0})".format(len(self.concentrations)))
+            return
+        if objective == "distance" and len(shown) != len(self.distances):
+            self.statusBar().showMessage("Show one well per distance ({0})".format(len(self.distances)))
+            return
+        #The shown wells are taken as replicates of one sample
+        wells = [shown] if objective == "replicates" else shown
+        threshold, cost, probes = self.plate.autoThreshold(wells,objective,concentrations=self.concentrations,
+                                                        distances=self.distances)
+        self.onSelectThresh(threshold)
+        self.statusBar().showMessage("Threshold {0:.4} ({1} {2:.4}, {3} thresholds tried)".format(threshold,str(name),cost,probes))
+
+    def computeHs(self,keep=True):
+        '''
+        Compute the cycle at which the selected data crosses the threshold value.
+        Wells that never cross keep their previous value, or are reset to -1 if
+        keep is False (the plate itself changed, so old values do not apply).
+        '''
+        cts = self.plate.computeCts(self.threshold)
+        crossed = np.isfinite(cts)
+        self.data["Hs"] = list(np.where(crossed,cts,self.data["Hs"] if keep else -1))
+        return crossed
+
+    def updateHCurves(self):
+        '''
+        Redraws the vertical lines marking each well's crossing cycle
+        '''
+        #Move the existing lines of shown wells rather than rebuilding them
+        for i,vline in self.data["HCurves"].items():
+            h = self.data["Hs"][i]
+            if h != -1:
+                vline.setValue(h)
+        #Shown wells that have just gained a crossing
+        for i in self.data["RawCurves"]:
+            if i not in self.data["HCurves"] and self.data["Hs"][i] != -1:
+                self.addHCurve(i)
+                self.data["HCurves"][i].setPen(self.wellColour(i))
 
     def onAddDistance(self):
         D1 =DistanceDialog(self.data,defaults=self.distances)
@@ -334,67 +621,96 @@ class QPCRAnalyser(QtGui.QMainWindow):
         self.cPlot.setLabel('left', "Delta H")
         self.cPlot.setLabel('top', "Delta H Delta G Plot")
         self.cPlot.plotItem.legend.items = []
-        Hs = [x for _,x in sorted(zip(distances,Hs))]
-        distances = sorted(distances)
-        xs = []
-        ys = []
-        for i in range(len(distances)-1):
-            for j in range(i+1,len(distances)):
-                xs.append(distances[j]-distances[i])
-                ys.append(Hs[j]-Hs[i])
+        xs, ys, slope, intercept, rSquared, slope2, median = deltaGDeltaH(distances,Hs)
         curve = pg.ScatterPlotItem(xs,ys,pen=(2,3))
-        slope, intercept, r_value, p_value, std_err = stats.linregress(xs,ys)
-        slope2, _, _, _ = np.linalg.lstsq(np.asarray(xs)[:,np.newaxis],ys,rcond=None)
         fitX = np.linspace(0,max(xs),100)
-        fitY = [slope*x + intercept for x in fitX]
-        deltaGOverDeltaHEstimates = [ys[k]/xs[k] for k in range(len(xs))]
-        #print("Median:{} Mean: {}".format(np.median(deltaGOverDeltaHEstimates), np.mean(deltaGOverDeltaHEstimates)))
-        #print("Slope1:{} Slope2: {}".format(slope, slope2))
-        #print(deltaGOverDeltaHEstimates)
+        fitY = slope*fitX + intercept
         self.cPlot.addItem(curve)
         fit1 = pg.PlotCurveItem(fitX,fitY,pen=(1,2))
         self.cPlot.addItem(fit1)
         fit2 = pg.PlotCurveItem(fitX,fitX*slope2,pen=(2,2))
         self.cPlot.addItem(fit2)
-        self.cPlot.plotItem.legend.addItem(fit1,"y = {0:.3} x + {1:.3} R2 {2:.4}".format(slope,intercept,r_value**2))
-        self.cPlot.plotItem.legend.addItem(fit2,"y = {0:.3} x".format(slope2[0]))
-        self.cPlot.plotItem.legend.addItem(curve,"Median = {0:.3}".format(np.median(deltaGOverDeltaHEstimates)))
-        self.cX = xs
-        self.cY = ys
+        self.cPlot.plotItem.legend.addItem(fit1,"y = {0:.3} x + {1:.3} R2 {2:.4}".format(slope,intercept,rSquared))
+        self.cPlot.plotItem.legend.addItem(fit2,"y = {0:.3} x".format(slope2))
+        self.cPlot.plotItem.legend.addItem(curve,"Median = {0:.3}".format(median))
+        self.cX = list(xs)
+        self.cY = list(ys)
         self.cFitX = fitX
         self.cFitY = fitY
-        return np.median(deltaGOverDeltaHEstimates), r_value**2
+        return median, rSquared
 
     def onSavePlot(self):
-        S1 = SaveWindow(self.data,self.threshold,self.rawThreshold, self.cX,self.cY,self.cFitX,self.cFitY,ctype=self.ctype)
+        S1 = SaveWindow(self.data,self.plate,self.threshold,self.rawThreshold, self.cX,self.cY,self.cFitX,self.cFitY,ctype=self.ctype)
 
-    def fitExpos(self):
+    def fitExpos(self,wells=None):
+        '''
+        Log linear fits around the crossing cycle of the shown wells. If wells is
+        given only those are refitted.
+        '''
         if self.threshold != None:
-            self.logPlot.plotItem.legend.items = []
-            n=np.sum(self.data["Visible"])
-            c = 0
-            for i in range(len(self.data["Cells"])):
-                if self.data["Visible"][i]:
-                    self.logPlot.removeItem(self.data["AlphaCurves"][i])
-                    h = round(self.data["Hs"][i])
-                    index = len([k for k in range(len(self.data["LogXs"][i])) if self.data["LogXs"][i][k] <= h])
-                    if index > 1:
-                        x = np.asarray(self.data["LogXs"][i])[index-2:index+2]
-                        y = np.asarray(self.data["LogYs"][i])[index-2:index+2]
-                        slope, intercept, r_value, p_value, std_err = stats.linregress(x,y)
-                        alpha = 2.0**(slope) - 1.0
-                        self.data["Alphas"][i] = alpha
-                        xFit = np.linspace(x[0],x[-1],100)
-                        yFit = [i*slope + intercept for i in xFit]
-                        curve = pg.PlotCurveItem(xFit,yFit,pen=(c,n))
-                        c = c + 1
-                        self.logPlot.addItem(curve)
-                        self.logPlot.plotItem.legend.addItem(curve,"a= {0:.3} t= {1:.3}".format(alpha,self.data["Hs"][i]))
-                        self.data["AlphaCurves"][i] = curve
-                    else:
-                        c = c+1
-                else:
-                    self.logPlot.removeItem(self.data["AlphaCurves"][i])
+            if wells is None:
+                wells = sorted(self.colourSlots)
+            for i in wells:
+                if i in self.data["AlphaCurves"]:
+                    curve = self.data["AlphaCurves"].pop(i)
+                    self.logPlot.plotItem.legend.removeItem(curve)
+                    self.logPlot.removeItem(curve)
+            #Only the shown wells are fitted
+            shown = sorted(i for i in wells if self.data["Visible"][i])
+            if len(shown) > 0:
+                self.fitShown(shown)
+        if self.overlayMode:
+            self.redrawOverlay()
+
+    def fitShown(self,shown):
+        '''
+        Fits and stores the log linear fits of shown wells, adding their curves
+        unless the overlay draws them
+        '''
+        hs = np.asarray(self.data["Hs"],dtype=float)[shown]
+        if self.bestWindowFits:
+            alphas, slopes, intercepts, xStarts, xEnds = self.plate.bestWindows(cts=hs,wells=shown)
+        else:
+            alphas, slopes, intercepts, xStarts, xEnds = self.plate.logLinearEfficiencies(hs,wells=shown)
+        for k,i in enumerate(shown):
+            if np.isfinite(alphas[k]):
+                alpha = alphas[k]
+                self.data["Alphas"][i] = alpha
+                xFit = np.linspace(xStarts[k],xEnds[k],100)
+                yFit = xFit*slopes[k] + intercepts[k]
+                self.data["AlphaFits"][i] = (xFit,yFit)
+                if self.overlayMode:
+                    continue
+                curve = pg.PlotCurveItem(xFit,yFit,pen=self.wellColour(i))
+                self.logPlot.addItem(curve)
+                self.logPlot.plotItem.legend.addItem(curve,"a= {0:.3} t= {1:.3}".format(alpha,self.data["Hs"][i]))
+                self.data["AlphaCurves"][i] = curve
+
+    def onBaselineToggle(self,checked):
+        '''
+        Swaps in the plate with or without baselines and redraws the shown wells
+        '''
+        self.baselineSubtraction = checked
+        if self.plate is None:
+            return
+        shown = sorted(self.colourSlots)
+        for i in shown:
+            self.hideWell(i)
+        self.plate = self.sessionPlate()
+        if self.threshold != None:
+            #Cts from the other plate must not survive where this one never crosses
+            self.computeHs(keep=False)
+        for i in shown:
+            self.showWell(i)
+        if not self.overlayMode:
+            self.updatePalette()
+            for i in shown:
+                self.colourWell(i)
+        self.fitExpos(shown)
+
+    def onBestWindowToggle(self,checked):
+        self.bestWindowFits = checked
+        self.fitExpos()
 
     def onComputeEfficiency(self,concs=None):
         if concs == None:
@@ -420,17 +736,15 @@ class QPCRAnalyser(QtGui.QMainWindow):
         y = list(np.log10(concentrations))
         x = (cts)
         curve = pg.ScatterPlotItem(x,y,pen=(2,3))
-        slope, intercept, r_value, p_value, std_err = stats.linregress(x,y)
+        slope, intercept, rSquared, efficiency = standardCurve(x,concentrations)
         fitX = np.linspace(min(x),max(x),100)
-        fitY = [slope*X + intercept for X in fitX]
+        fitY = slope*fitX + intercept
         curveFit = pg.PlotCurveItem(fitX,fitY,pen=(1,2))
         self.cPlot.addItem(curve)
         self.cPlot.addItem(curveFit)
         self.cPlot.plotItem.legend.addItem(curveFit,"y = {0:.3} x + {1:.3}".format(slope,intercept))
-        #efficiency =((10**(-1.0/slope)) -1 )*100.0
-        efficiency =((10**(-1.0*slope)) -1 )*100
         self.standardCurveEfficienty = efficiency
-        self.cPlot.plotItem.legend.addItem(curve,"R2={0:.3} EFF={1:.4}".format(r_value**2,efficiency))
+        self.cPlot.plotItem.legend.addItem(curve,"R2={0:.3} EFF={1:.4}".format(rSquared,efficiency))
         self.cX = x
         self.cY = y
         self.cFitX = fitX
@@ -443,15 +757,10 @@ class QPCRAnalyser(QtGui.QMainWindow):
             if self.data["Visible"][i]:
                 indexes.append(i)
         thresholds = np.linspace(0.0001,0.5,200)
-        curveEfficiencies = []
-        linearEfficiencies = []
-        for i in thresholds:
-            self.onSelectThresh(np.log2(i))
-            self.onComputeEfficiency(concs=self.concentrations)
-            curveEfficiencies.append(self.standardCurveEfficienty)
-            meanLinearEfficiency = 100.0*np.mean([self.data["Alphas"][j] for j in indexes])
-            linearEfficiencies.append(meanLinearEfficiency)
-            self.app.processEvents()
+        #Whole grid is computed in one pass, only the result is drawn
+        curveEfficiencies, linearEfficiencies = self.plate.thresholdScan(indexes,np.log2(thresholds),self.concentrations)
+        curveEfficiencies = list(curveEfficiencies)
+        linearEfficiencies = list(linearEfficiencies)
         self.cPlot.clear()
         self.cPlot.plotItem.legend.items = []
         self.cPlot.setLabel('left', "Efficiency")
@@ -476,19 +785,23 @@ class QPCRAnalyser(QtGui.QMainWindow):
         './',filter="*.csv")
         #If file selected start reading file
         if filePath != '':
-            f = open(filePath,"w")
-            for i in range(len(self.data["Xs"][0])):
-                line = ''
-                for j in range(-1,len(self.data["Xs"])):
-                    if j == -1:
-                        line += str(self.data["Xs"][j][i])
-                    else:
-                        if self.data["Visible"][j]:
-                            line += " , "
-                            line += str(self.data["Ys"][j][i])
+            shown = [i for i in range(len(self.plate)) if self.data["Visible"][i]]
+            exportPetersFormat(filePath,self.plate,wells=shown)
 
-                line += "\n"
-                f.write(line)
+    def onExportData(self):
+        '''
+        Saves the shown wells as a long format csv or a binary .npz file, one
+        plate per run so every row keeps the name of the run it came from
+        '''
+        filePath, filter = QtGui.QFileDialog.getSaveFileName(self,'Export data',
+        './',filter="*.csv *.npz")
+        if filePath != '':
+            shown = [i for i in range(len(self.plate)) if self.data["Visible"][i]]
+            plates = self.session.runPlates(self.plate,shown)
+            if filePath.lower().endswith(".npz"):
+                savePlates(filePath,plates,metadata={"Files":self.data["Files"]})
+            else:
+                exportPlatesCsv(filePath,plates)
 
     def CalcLREEfficiency(self):
         #Plotting stuff
@@ -499,67 +812,84 @@ class QPCRAnalyser(QtGui.QMainWindow):
         self.cPlot.plotItem.legend.items = []
 
         if self.LREZones != None:
-            for zone in self.LREZones:
+            for zone in self.LREZones.values():
                 self.rawPlot.removeItem(zone)
-        self.LREZones = []
+        self.LREZones = {}
+        self.LREItems = {}
+        self.LREPending = set()
+        if self.LRETimer is None:
+            #Refits while a region is dragged are coalesced to one per frame
+            self.LRETimer = QtCore.QTimer()
+            self.LRETimer.setSingleShot(True)
+            self.LRETimer.setInterval(16)
+            self.LRETimer.timeout.connect(self.onLRETimer)
 
-        c = 0
-        for i in range(len(self.data["Xs"])):
-            if self.data["Visible"][i]:
-                x = self.data["Xs"][i]
-                y = self.data["Ys"][i]
-                flourescence = y[1:]
-                cycleEfficiency = [(y[j]/y[j-1]) -1 for j in range(1,len(y))]
-                curve = pg.ScatterPlotItem(flourescence,cycleEfficiency,pen=None,brush=(c,sum(self.data["Visible"])))
-                self.cPlot.addItem(curve)
-                hReigon = pg.LinearRegionItem([min(x),0.1*max(x)],movable=True,bounds=[min(x),max(x)])
-                color = pg.mkColor((c,sum(self.data["Visible"])))
-                color.setAlpha(int(25))
-                hReigon.setBrush(color)
-                self.rawPlot.addItem(hReigon)
-                self.LREZones.append(hReigon)
-                hReigon.sigRegionChangeFinished.connect(self.replotLRE)
-                c+=1
-
-    def replotLRE(self):
-        self.cPlot.clear()
-        c = 0
-        for i in range(len(self.data["Xs"])):
-            if self.data["Visible"][i]:
-                x = self.data["Xs"][i]
-                y = np.asarray(self.data["Ys"][i])
-                flourescence = y[1:]
-                minX, maxX = self.LREZones[c].getRegion()
-                flourescence = [flourescence[j] for j in range(len(x)) if x[j] >= minX and x[j] <= maxX]
-                cycleEfficiency = [(y[j]/y[j-1]) - 1.0 for j in range(1,len(y))]
-                cycleEfficiency = [cycleEfficiency[j] for j in range(len(x)) if x[j] >= minX and x[j] <= maxX]
-                curve = pg.ScatterPlotItem(flourescence,cycleEfficiency,pen=None, brush=(c,sum(self.data["Visible"])))
-                self.cPlot.addItem(curve)
-                #Fit
-                slope, intercept, r_value, p_value, std_err = stats.linregress(flourescence,cycleEfficiency)
-                xPredict = np.linspace(0,max(flourescence),100)
-                yPredict = slope*xPredict + intercept
-                curve = pg.PlotCurveItem(xPredict,yPredict,pen=(c,sum(self.data["Visible"])))
-                self.cPlot.addItem(curve)
-                c+=1
+        x = self.plate.cycles
+        shown = [i for i in range(len(self.plate)) if self.data["Visible"][i]]
+        flourescence, cycleEfficiency = self.plate.cycleEfficiencies(shown)
+        for k,i in enumerate(shown):
+            curve = pg.ScatterPlotItem(flourescence[k],cycleEfficiency[k],pen=None,brush=self.wellColour(i))
+            self.cPlot.addItem(curve)
+            fit = pg.PlotCurveItem(pen=self.wellColour(i))
+            self.cPlot.addItem(fit)
+            self.LREItems[i] = (curve,fit)
+            hReigon = pg.LinearRegionItem([min(x),0.1*max(x)],movable=True,bounds=[min(x),max(x)])
+            color = pg.mkColor(self.wellColour(i))
+            color.setAlpha(int(25))
+            hReigon.setBrush(color)
+            self.rawPlot.addItem(hReigon)
+            self.LREZones[i] = hReigon
+            hReigon.sigRegionChanged.connect(lambda zone,i=i: self.onLREZoneMoved(i))
+
+    def onLREZoneMoved(self,i):
+        '''
+        Queues a refit of well i, fired once the current frame's moves are in
+        '''
+        self.LREPending.add(i)
+        if not self.LRETimer.isActive():
+            self.LRETimer.start()
+
+    def onLRETimer(self):
+        wells = sorted(self.LREPending)
+        self.LREPending = set()
+        self.replotLRE(wells)
+
+    def replotLRE(self,wells=None):
+        '''
+        Refits the LRE of the given wells (all with a region if None) to the
+        points inside their regions
+        '''
+        if wells is None:
+            wells = sorted(self.LREZones)
+        wells = [i for i in wells if i in self.LREZones]
+        if len(wells) == 0:
+            return
+        regions = np.array([self.LREZones[i].getRegion() for i in wells],dtype=float)
+        slopes, intercepts, rSquareds = self.plate.efficiencyFits(wells,regions[:,0],regions[:,1])
+        starts, stops = self.plate.cycleRange(regions[:,0],regions[:,1])
+        flourescence, cycleEfficiency = self.plate.cycleEfficiencies(wells)
+        for k,i in enumerate(wells):
+            curve, fit = self.LREItems[i]
+            xs = flourescence[k,starts[k]:stops[k]]
+            ys = cycleEfficiency[k,starts[k]:stops[k]]
+            curve.setData(xs,ys)
+            if np.isfinite(slopes[k]):
+                xPredict = np.linspace(0,np.nanmax(xs),100)
+                fit.setData(xPredict,slopes[k]*xPredict + intercepts[k])
+            else:
+                fit.setData([],[])
 
     def onDeltaHDeltaGSweep(self):
         thresholds = np.linspace(0.001,2,200)
-        medians = []
-        rsquareds = []
         indexes = []
         for i in range(len(self.data["Visible"])):
             if self.data["Visible"][i]:
                 indexes.append(i)
         self.onAddDistance()
-        for threshold in thresholds:
-            self.onSelectThresh(np.log2(threshold))
-            Hs = [self.data["Hs"][j] for j in indexes]
-            distances =  self.distances
-            median , rsquared = self.plotDeltaGDeltaH(distances,Hs)
-            medians.append(median)
-            rsquareds.append(rsquared)
-            self.app.processEvents()
+        #All thresholds are reduced together, only the final curves are drawn
+        medians, slopes, rsquareds = self.plate.deltaGDeltaHSweep(indexes,np.log2(thresholds),self.distances)
+        medians = list(medians)
+        rsquareds = list(rsquareds)
         self.cPlot.clear()
         self.cPlot.plotItem.legend.items = []
         self.cPlot.setLabel('left', "R squared/ Median")
@@ -652,9 +982,10 @@ class DistanceDialog(QtGui.QDialog):
 
 class SaveWindow(QtGui.QMainWindow):
 
-    def __init__(self,data,thresh,rawThresh,cX,cY,cFitX,cFitY,ctype="Callibration",parent=None):
+    def __init__(self,data,plate,thresh,rawThresh,cX,cY,cFitX,cFitY,ctype="Callibration",parent=None):
         QtGui.QMainWindow.__init__(self,parent)
         self.data = data
+        self.plate = plate
         self.ctype = ctype
         self.thresh = thresh
         self.rawThresh = rawThresh
@@ -714,71 +1045,22 @@ class SaveWindow(QtGui.QMainWindow):
     def plotData(self):
         self.figure.clear()
         ax = self.figure.add_subplot(111)
+        shown = [i for i in range(len(self.data["Cells"])) if self.data["Visible"][i]]
+        labels = [self.data["Cells"][i] for i in shown]
         if self.rawButton.isChecked():
             #Plot raw data
-            for i in range(len(self.data["Cells"])):
-                if self.data["Visible"][i]:
-                    x = self.data["Xs"][i]
-                    y = self.data["Ys"][i]
-                    ax.plot(x,y, '.--',label=self.data["Cells"][i])
-            ax.legend()
-            ax.set_xlabel("Cycle number")
-            ax.set_ylabel("Flourescence")
-            if self.rawThresh != None and self.threshButton.isChecked():
-                ax.axhline(self.rawThresh,color = 'k')
+            rawThresh = self.rawThresh if self.threshButton.isChecked() else None
+            drawRaw(ax,self.plate,shown,labels,rawThresh)
 
         if self.logButton.isChecked():
             #Plot log data
-            for i in range(len(self.data["Cells"])):
-                if self.data["Visible"][i]:
-                    x = self.data["LogXs"][i]
-                    y = self.data["LogYs"][i]
-                    if self.thresh == None or self.fitButton.isChecked() == False:
-                        p = ax.plot(x,y, '.--',label = self.data["Cells"][i])
-                    else:
-                        p = ax.plot(x,y, '.--')
-                    alphaX, alphaY = self.data["AlphaCurves"][i].getData()
-                    if self.thresh != None:
-                        if self.fitButton.isChecked():
-                            ax.plot(alphaX,alphaY,color=p[0].get_color(),label=self.data["Cells"][i] + " a= {0:.3}".format(self.data["Alphas"][i]))
-                        if self.threshButton.isChecked():
-                            ax.axvline(self.data["Hs"][i],color=p[0].get_color())
-                    else:
-                        ax.plot(alphaX,alphaY,color=p[0].get_color(),label=self.data["Cells"][i])
-            #Hline at thresh value
-            if self.thresh != None and self.threshButton.isChecked():
-                ax.axhline(self.thresh,color = 'k')
-            ax.legend()
-            ax.set_xlabel("Cycle number")
-            ax.set_ylabel("Log Flourescence")
+            drawLog(ax,self.plate,shown,labels,self.thresh,[self.data["Hs"][i] for i in shown],
+                    [self.data["Alphas"][i] for i in shown],[self.data["AlphaFits"][i] for i in shown],
+                    showThresh=self.threshButton.isChecked(),showFits=self.fitButton.isChecked())
 
         if self.cButton.isChecked() and self.cX != None:
             #Plot c period plot
-            if self.ctype == "Callibration":
-                slope, intercept, r_value, p_value, std_err = stats.linregress(self.cX,self.cY)
-                efficiency =((10**(-slope)) -1 )*100.0
-                ax.plot(self.cX,self.cY,'.',label="Efficiency {0:.4}% R2 {1:.3}".format(efficiency,r_value**2))
-                ax.plot(self.cFitX,self.cFitY,'--',label="y= {0:.3}x + {1:.3}".format(slope,intercept))
-                ax.legend()
-                ax.set_ylabel("Log(initial concentration)")
-                ax.set_xlabel("ct")
-            elif self.ctype == "Distance" :
-                slope, intercept, r_value, p_value, std_err = stats.linregress(self.cX,self.cY)
-                ax.plot(self.cX,self.cY,'.')
-                ax.plot(self.cFitX,self.cFitY,'--',label="y= {0:.3}x + {1:.3} R2 {2:.4}".format(slope,intercept,r_value**2))
-                slope2, _, _, _ = np.linalg.lstsq(np.asarray(self.cX)[:,np.newaxis],self.cY,rcond=None)
-                ax.plot(self.cX,self.cX*slope2, '-', label= "y= {0:.3}x".format(slope2[0]))
-                ax.plot([], [], ' ', label="Median of points: {0:.3}".format(np.median(np.asarray(self.cY)/np.asarray(self.cX))))
-                ax.legend()
-                ax.set_xlabel("Delta G")
-                ax.set_ylabel("Delta H")
-            elif self.ctype == "Efficiency":
-                ax.plot(self.cX,self.cY,'--',label="Standard curve efficiency")
-                ax.plot(self.cFitX,self.cFitY,'--',label="Linear log efficiency")
-                ax.legend()
-                ax.set_xlabel("Threshold value")
-                ax.set_ylabel("Efficiency")
-
+            drawCurve(ax,self.ctype,self.cX,self.cY,self.cFitX,self.cFitY)
 
         # refresh canvas
         self.canvas.draw()
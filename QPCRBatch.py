@@ -0,0 +1,130 @@
+import numpy as np
+import argparse
+import glob
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from QPCRFiles import readPlate, PlateCache
+from QPCRExport import writeColumns, saveTable
+
+columns = ["File","Well","Dye","Threshold","Ct","LogLinearEfficiency","Curve","StandardCurveEfficiency","StandardCurveR2"]
+
+def findPlates(paths):
+    '''
+    Expands directories into the .txt and .lc96p plate files they contain
+    '''
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for pattern in ("*.txt","*.lc96p"):
+                files.extend(sorted(glob.glob(os.path.join(path,pattern))))
+        else:
+            files.append(path)
+    return files
+
+def analysePlate(filePath,thresholds,curves,concentrations,span=4,cacheDir=None,baseline=False):
+    '''
+    Ct, log linear efficiency and standard curve efficiency of every well of one
+    plate at every threshold, after subtracting each well's baseline if baseline
+    is True. Returns the columns of the results table.
+    '''
+    cache = PlateCache(cacheDir) if cacheDir is not None else None
+    plate = readPlate(filePath,cache=cache)
+    if baseline:
+        plate = plate.subtractBaseline()
+    thresholds = np.asarray(thresholds,dtype=float)
+    cts = plate.computeCts(thresholds)
+    alphas = plate.logLinearEfficiencies(cts,span=span)[0]
+    #Standard curve of each dilution series, repeated on each of its wells
+    curveNames = np.full(len(plate),"",dtype=object)
+    curveEfficiencies = np.full(cts.shape,np.nan)
+    curveRSquareds = np.full(cts.shape,np.nan)
+    for curve in curves:
+        selected = plate.index([w for w in curve if w in plate.wellIndex])
+        if len(selected) != len(concentrations):
+            continue
+        slope, intercept, rSquared, efficiency = plate.standardCurve(selected,thresholds,concentrations)
+        curveNames[selected] = "-".join(curve)
+        curveEfficiencies[:,selected] = efficiency[:,None]
+        curveRSquareds[:,selected] = rSquared[:,None]
+    #One row per threshold and well, built as columns
+    nThresholds, nWells = cts.shape
+    name = os.path.split(filePath)[1]
+    return [np.full(nThresholds*nWells,name,dtype=object),np.tile(plate.wells,nThresholds),
+            np.tile(plate.dyes,nThresholds),np.repeat(thresholds,nWells),cts.ravel(),
+            100.0*alphas.ravel(),np.tile(curveNames,nThresholds),curveEfficiencies.ravel(),
+            curveRSquareds.ravel()]
+
+def tryAnalysePlate(filePath,*args):
+    '''
+    analysePlate that returns (columns, None), or (None, error message) when the
+    plate cannot be read or analysed, so one bad file does not stop a batch
+    '''
+    try:
+        return analysePlate(filePath,*args), None
+    except Exception as e:
+        return None, "{0}: {1}".format(type(e).__name__,e)
+
+def runBatch(files,thresholds,curves,concentrations,outPath,span=4,workers=None,cacheDir=None,baseline=False):
+    '''
+    Fans the plates out over a process pool and writes one consolidated table,
+    streamed as csv or, for an .npz outPath, saved as binary columns. Plates
+    that fail are reported on stderr and left out; returns their file paths.
+    '''
+    binary = outPath.lower().endswith(".npz")
+    failed = []
+    if binary:
+        tables = []
+    elif outPath == "-":
+        out = sys.stdout
+    else:
+        out = open(outPath,"w",newline="")
+    try:
+        if not binary:
+            out.write(",".join(columns) + "\n")
+        n = len(files)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            chunk = max(1,n//(4*(workers or os.cpu_count() or 1)))
+            results = pool.map(tryAnalysePlate,files,[thresholds]*n,[curves]*n,[concentrations]*n,
+                            [span]*n,[cacheDir]*n,[baseline]*n,chunksize=chunk)
+            for filePath,(table,error) in zip(files,results):
+                if error is not None:
+                    sys.stderr.write("{0}: {1}\n".format(filePath,error))
+                    failed.append(filePath)
+                elif binary:
+                    tables.append(table)
+                else:
+                    writeColumns(out,table)
+        if binary:
+            saveTable(outPath,[np.concatenate(c) for c in zip(*tables)] if tables else [[]]*len(columns),columns)
+    finally:
+        if not binary and out is not sys.stdout:
+            out.close()
+    return failed
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch analysis of QPCR plates (.txt exports and .lc96p run files)")
+    parser.add_argument("paths",nargs="+",help="plate files or directories of plates")
+    parser.add_argument("-t","--threshold",type=float,action="append",required=True,
+                        help="log2 threshold, may be given several times")
+    parser.add_argument("-c","--curve",action="append",default=[],
+                        help="comma separated dilution wells of a standard curve e.g. A7,A8,A9,A10,A11")
+    parser.add_argument("--concentrations",default="1.0,0.2,0.04,0.008,0.0016",
+                        help="comma separated concentrations of the standard curve wells")
+    parser.add_argument("--span",type=int,default=4,help="points in the log linear fit")
+    parser.add_argument("-j","--workers",type=int,default=None,help="number of processes (default all cores)")
+    parser.add_argument("--baseline",action="store_true",help="subtract a fitted linear baseline from each well")
+    parser.add_argument("--cache-dir",default=None,help="use a plate cache in this directory")
+    parser.add_argument("-o","--output",default="-",help="results csv, or .npz for binary columns (default stdout)")
+    args = parser.parse_args(argv)
+    files = findPlates(args.paths)
+    curves = [c.split(",") for c in args.curve]
+    concentrations = [float(c) for c in args.concentrations.split(",")]
+    failed = runBatch(files,args.threshold,curves,concentrations,args.output,span=args.span,
+                    workers=args.workers,cacheDir=args.cache_dir,baseline=args.baseline)
+    if failed:
+        sys.stderr.write("{0} of {1} plates failed\n".format(len(failed),len(files)))
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+import numpy as np
+import json
+from QPCRPlate import Plate
+
+def quoteText(values,sep=","):
+    '''
+    Quotes, csv style, the values containing the separator, a quote or a line
+    break. A whole column is checked at once so the usual case costs one join.
+    '''
+    special = (sep,'"',"\n","\r")
+    if len(sep) == 1 and not any(c in "".join(values) for c in special):
+        return values
+    return ['"' + v.replace('"','""') + '"' if any(c in v for c in special) else v for v in values]
+
+def formatColumn(column,sep=","):
+    '''
+    Text of every value of a column as a list. Values are unboxed with a single
+    tolist call, floats keep their shortest round trip repr and text is quoted
+    where it would otherwise break a row split on sep.
+    '''
+    column = np.asarray(column)
+    if column.dtype.kind == "f":
+        return list(map(repr,column.tolist()))
+    if column.dtype.kind in "iub":
+        return list(map(str,column.tolist()))
+    return quoteText(np.asarray(column,dtype=str).tolist(),sep)
+
+def writeColumns(f,columns,header=None,sep=",",chunkRows=2**16):
+    '''
+    Streams equal length columns to an open text file as delimited rows,
+    converting and writing chunkRows rows at a time
+    '''
+    if header is not None:
+        f.write(sep.join(quoteText(list(header),sep)) + "\n")
+    nRows = len(columns[0]) if len(columns) > 0 else 0
+    for start in range(0,nRows,chunkRows):
+        chunk = [formatColumn(c[start:start+chunkRows],sep) for c in columns]
+        f.write("\n".join(map(sep.join,zip(*chunk))) + "\n")
+
+def exportPetersFormat(filePath,plate,wells=None):
+    '''
+    Cycles down the rows and one column of fluorescence per well, the layout
+    the analyser has always saved
+    '''
+    rows = plate.index(wells)
+    cycles = np.asarray(["{0:g}".format(c) for c in plate.cycles])
+    f = open(filePath,"w")
+    writeColumns(f,[cycles] + list(plate.fluorescence[rows]),sep=" , ")
+    f.close()
+
+def plateColumns(plate,wells=None):
+    '''
+    Long format columns of a plate, one row per well and cycle. The cycle text
+    is formatted once per plate and tiled, leaving one column of values to format.
+    '''
+    rows = plate.index(wells)
+    nCycles = len(plate.cycles)
+    return [np.full(len(rows)*nCycles,plate.name or "",dtype=object),np.repeat(plate.wells[rows],nCycles),
+            np.repeat(plate.dyes[rows],nCycles),np.tile(formatColumn(plate.cycles),len(rows)),
+            plate.fluorescence[rows].ravel()]
+
+def exportPlatesCsv(filePath,plates,wells=None):
+    '''
+    Writes the given wells (all if None) of one or more plates to a long format
+    csv, a plate at a time so only one plate's text is ever built
+    '''
+    if isinstance(plates,Plate):
+        plates = [plates]
+    f = open(filePath,"w",newline="")
+    f.write("Plate,Well,Dye,Cycle,Fluorescence\n")
+    for plate in plates:
+        selected = None if wells is None else [w for w in wells if not isinstance(w,str) or w in plate.wellIndex]
+        writeColumns(f,plateColumns(plate,selected))
+    f.close()
+
+def savePlates(filePath,plates,wells=None,metadata=None):
+    '''
+    Compact binary columnar file (.npz) of one or more plates. Fluorescence of
+    every well is stacked in one wells x cycles array, padded with NaN where a
+    plate has fewer cycles, next to per well (plate, well, dye) and per plate
+    (name, cycles) columns. metadata is an optional json serialisable dict.
+    '''
+    if isinstance(plates,Plate):
+        plates = [plates]
+    selected = [p.index(None if wells is None else [w for w in wells if not isinstance(w,str) or w in p.wellIndex]) for p in plates]
+    nCycles = max([len(p.cycles) for p in plates] + [0])
+    fluorescence = np.full((sum(len(s) for s in selected),nCycles),np.nan)
+    cycles = np.full((len(plates),nCycles),np.nan)
+    start = 0
+    for k,(plate,rows) in enumerate(zip(plates,selected)):
+        fluorescence[start:start+len(rows),:len(plate.cycles)] = plate.fluorescence[rows]
+        cycles[k,:len(plate.cycles)] = plate.cycles
+        start += len(rows)
+    np.savez(filePath,fluorescence=fluorescence,cycles=cycles,
+            plateNames=np.asarray([p.name or "" for p in plates],dtype=str),
+            plateCycles=np.asarray([len(p.cycles) for p in plates],dtype=int),
+            plate=np.repeat(np.arange(len(plates)),[len(s) for s in selected]),
+            wells=np.concatenate([p.wells[s] for p,s in zip(plates,selected)] + [np.zeros(0,dtype=str)]),
+            dyes=np.concatenate([p.dyes[s] for p,s in zip(plates,selected)] + [np.zeros(0,dtype=str)]),
+            metadata=np.asarray(json.dumps(metadata or {})))
+
+def loadPlates(filePath):
+    '''
+    Plates and metadata dict from a file written by savePlates
+    '''
+    data = np.load(filePath)
+    plates = []
+    for k,name in enumerate(data["plateNames"]):
+        rows = data["plate"] == k
+        n = data["plateCycles"][k]
+        plates.append(Plate(data["fluorescence"][rows,:n],data["wells"][rows],cycles=data["cycles"][k,:n],
+                            dyes=data["dyes"][rows],name=str(name)))
+    metadata = json.loads(str(data["metadata"]))
+    data.close()
+    return plates, metadata
+
+def saveTable(filePath,columns,names):
+    '''
+    Binary columnar (.npz) version of a results table, one array per column
+    '''
+    arrays = {}
+    for name,column in zip(names,columns):
+        column = np.asarray(column)
+        arrays[name] = column.astype(str) if column.dtype == object else column
+    np.savez(filePath,**arrays)
@@ -1,6 +1,7 @@
 import numpy as np
 import matplotlib.pyplot as plt
 from scipy import stats
+from QPCRPlate import thresholdCrossings, standardCurves
 #Parameters
 filePath = "Data/QPCRExperiments_TextFiles/dario_04_03_19_ori-terminus_m631_06.txt"
 cellsToRead = ["A7","A8","A9","A10","A11","B7","B8","B9","B10","B11","C7","C8","C9","C10","C11","D7","D8","D9","D10","D11"]
@@ -145,38 +146,16 @@ currentAxis = ax[1][1]
 
 
 #Standard curve
-#Function to get ct
-def getCt(x,y,thresh):
-    for i,yValue in enumerate(y):
-        if yValue == thresh:
-            ct = x[y.index(yValue)]
-        if yValue > thresh:
-            x1 = x[i-1]
-            x2 = x [i]
-            y1 = y[i-1]
-            y2 = yValue
-            m = (y2-y1)/(x2-x1)
-            c = y2-(m*x1)
-            ct = (thresh-c)/m
-            return ct
-
-
-standardsEff = []
-for thresh in logThresholds:
-    ctValues = np.zeros((len(concentrations), 4))
-    for repeat in range(4):
-        for conc in range(len(concentrations)):
-            yData = dataDic[cellsToRead[repeat*5 + conc]]
-            xData = [i+1 for i in range(len(yData))]
-            ctValues[conc][repeat] =  getCt(xData,yData,2**thresh)
-            #print("Threshold:" + str(2**thresh))
-
-
-    meanCts = np.mean(ctValues,axis=1)
-    print(thresh)
-    print(meanCts)
-    slope, intercept, r_value, p_value, std_err = stats.linregress(np.log10(concentrations), meanCts)
-    standardsEff.append((10**(-1.0/slope) -1)*100 )
+#Cts of every repeat and concentration at every threshold in one pass
+ys = np.asarray([dataDic[cell] for cell in cellsToRead])
+xData = np.arange(1,ys.shape[1]+1)
+ctValues = thresholdCrossings(xData,ys,2**logThresholds).reshape(len(logThresholds),4,len(concentrations))
+meanCts = np.mean(ctValues,axis=1)
+print(logThresholds)
+print(meanCts)
+slopes, intercepts, rSquareds, stdErrs, standardsEff = standardCurves(meanCts,concentrations)
+#Error of the slope carried through to the efficiency
+std_err = 100*np.log(10)*(10**(-1.0/slopes))*stdErrs/(slopes*slopes)
 #currentAxis.plot(np.log10(concentrations),meanCts)
 print(standardsEff)
 currentAxis.plot(logThresholds,standardsEff,color="C3",label="Standard curve")
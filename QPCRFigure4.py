@@ -5,50 +5,44 @@ import matplotlib.gridspec as gridspec
 from scipy import stats
 import time
 import copy
+from QPCRStats import bootstrap, confidenceInterval, rejectOutliers, conditionCPeriods, meanStdErr
+from QPCRFiles import CtSets
 concentrations = [1/(5**i) for i in range((5))]
 logConc = np.log10(concentrations)
 tickLabelFontSize = 15
 axisLabelFontSize = 20
-def readCts(path):
-    f = open(path)
-    oriCts = []
-    terCts = []
-    ters = False
-    for line in f.readlines():
-        if line.strip().split(",") == [""]:
-            ters = True
-        else:
-            stripLine = line.strip().split(",")
-            cts = [float(strp) for strp in stripLine]
-            if not ters:
-                oriCts.append(cts)
-            if ters:
-                terCts.append(cts)
-    oriCts.append(list(np.mean(oriCts,axis=0)))
-    terCts.append(list(np.mean(terCts,axis=0)))
-    oriCts.append(list(np.std(oriCts[0:-1],axis=0,ddof=1)))
-    terCts.append(list(np.std(terCts[0:-1],axis=0,ddof=1)))
-    slope, intercept, r_value, p_value, std_err = stats.linregress(logConc, oriCts[-2])
-    oriCts.append(list(logConc*slope + intercept))
-    oriSlope = slope
-    slope, intercept, r_value, p_value, std_err = stats.linregress(logConc, terCts[-2])
-    terSlope = slope
-    terCts.append(list(logConc*slope + intercept))
-    return oriCts,terCts, oriSlope, terSlope
-
-which = 1
-if which == 1:
-    ori1Cts, ter1Cts, ori1Slope, ter1Slope = readCts("Data/HighOsmoDataForFigure/M63_1.csv")
-    ori2Cts, ter2Cts, ori2Slope, ter2Slope = readCts("Data/HighOsmoDataForFigure/M63_2.csv")
-    tau = 39.6
-if which == 2:
-    ori1Cts, ter1Cts, ori1Slope, ter1Slope = readCts("Data/HighOsmoDataForFigure/200mM_1.csv")
-    ori2Cts, ter2Cts, ori2Slope, ter2Slope = readCts("Data/HighOsmoDataForFigure/200mM_2.csv")
-    tau = 46
-if which == 3:
-    ori1Cts, ter1Cts, ori1Slope, ter1Slope = readCts("Data/HighOsmoDataForFigure/600mM_1.csv")
-    ori2Cts, ter2Cts, ori2Slope, ter2Slope = readCts("Data/HighOsmoDataForFigure/600mM_2.csv")
-    tau = 80
+def figureRows(sets,summary,condition,sample,target):
+    '''
+    Replicate, mean, std and fitted ct rows of one sample and target, the
+    layout the plots below index into
+    '''
+    c = sets.conditions.index(condition)
+    s = sets.samples[c].index(sample)
+    t = sets.targets.index(target)
+    rows = [list(r) for r in sets.cts[c,s,t]]
+    rows.append(list(summary["means"][c,s,t]))
+    rows.append(list(summary["stds"][c,s,t]))
+    rows.append(list(logConc*summary["slopes"][c,s,t] + summary["intercepts"][c,s,t]))
+    return rows, summary["slopes"][c,s,t]
+
+#Every csv is read once, summaries are kept apart from the cts
+ctSets = CtSets("Data/HighOsmoDataForFigure")
+summary = ctSets.summary(concentrations)
+#Samples and doubling time of each condition, which is the one drawn
+conditions = {"M63":(["1","2"],39.6),"200mM":(["1","2"],46),"600mM":(["1","2"],80)}
+which = "M63"
+names = list(conditions)
+taus = np.asarray([conditions[name][1] for name in names])
+#Replicate cts of every condition, conditions x samples x replicates x dilutions
+sampleCts = np.asarray([ctSets.condition(name,conditions[name][0]) for name in names])
+oriReplicates = sampleCts[:,:,ctSets.targets.index("ori")]
+terReplicates = sampleCts[:,:,ctSets.targets.index("ter")]
+drawn = names.index(which)
+ori1Cts, ori1Slope = figureRows(ctSets,summary,which,conditions[which][0][0],"ori")
+ter1Cts, ter1Slope = figureRows(ctSets,summary,which,conditions[which][0][0],"ter")
+ori2Cts, ori2Slope = figureRows(ctSets,summary,which,conditions[which][0][1],"ori")
+ter2Cts, ter2Slope = figureRows(ctSets,summary,which,conditions[which][0][1],"ter")
+tau = taus[drawn]
 
 fig = plt.figure(figsize=(14,10))
 
@@ -130,41 +124,16 @@ axes[2].set_ylabel("$Residuals$",fontsize=axisLabelFontSize)
 
 
 #Bottom left plot corrected standard curves
-def improveStd(data, thresh = 0.03):
-    best = np.std(data,ddof=1)
-    newData = data.copy()
-    while best > thresh and len([d for d in newData if d != None]) > 2:
-        for i in range(len(newData)):
-            #print("best {} \t data: {}".format(best,newData))
-            if newData[i] != None:
-                tempData = newData.copy()
-                tempData[i] = None
-                newBest = np.std([d for d in tempData if d != None],ddof=1)
-                if newBest < best:
-                    best = newBest
-                    indexToRemove =i
-        newData[indexToRemove] = None
-        #time.sleep(1)
-    return newData
-
-def removeNone(array):
-    newArray = []
-    for a in array:
-        if a != None:
-            newArray.append(a)
-    return copy.deepcopy(newArray)
-
-
 runs = [ori1Cts,ori2Cts,ter1Cts,ter2Cts]
+#Replicates x dilutions x runs, outliers of every column dropped in one call
+replicates = np.moveaxis(np.asarray([run[0:4] for run in runs]),0,-1)
+cleaned = np.where(rejectOutliers(replicates,threshold=0.03),replicates,np.nan)
 newRuns = copy.deepcopy(runs)
 for i in range(len(runs)):
-    for j in range(5):
-        column = [runs[i][k][j] for k in range(4)]
-        newColumn = improveStd(column)
-        for l in range(len(newColumn)):
-            newRuns[i][l][j] = newColumn[l]
-        newRuns[i][4][j] = np.mean(removeNone(newColumn))
-        newRuns[i][5][j] = np.std(removeNone(newColumn),ddof=1)
+    for l in range(4):
+        newRuns[i][l] = list(cleaned[l,:,i])
+    newRuns[i][4] = list(np.nanmean(cleaned[:,:,i],axis=0))
+    newRuns[i][5] = list(np.nanstd(cleaned[:,:,i],axis=0,ddof=1))
 #Now we have replaced average values we can do fits
 slopes = []
 for run in newRuns:
@@ -215,23 +184,22 @@ plt.show()
 plt.clf()
 plt.close()
 fig = plt.figure(figsize=(14,9))
-#Time to compute actual c periods
-
-cts1 = []
-cts2 = []
-for r in range(len(newRuns[0][0])):
-    ori1_ter1 = ((alphas[2]+1)**newRuns[2][-3][r])/((alphas[0]+1)**newRuns[0][-3][r])
-    ori2_ter2 =  ((alphas[3]+1)**newRuns[3][-3][r])/((alphas[1]+1)**newRuns[1][-3][r])
-    ct1 = tau*np.log2(ori1_ter1)
-    ct2 = tau*np.log2(ori2_ter2)
-    cts1.append(ct1)
-    cts2.append(ct2)
-
+#Time to compute actual c periods, every condition at once from its cleaned replicates
+def cleanReplicates(cts):
+    replicates = np.moveaxis(cts,2,0)
+    return np.moveaxis(np.where(rejectOutliers(replicates,threshold=0.03),replicates,np.nan),0,2)
+aOri, aTer, cPeriodValues, means, stdErrs = conditionCPeriods(cleanReplicates(oriReplicates),
+                                                            cleanReplicates(terReplicates),concentrations,taus)
+cts1, cts2 = cPeriodValues[drawn]
+mean, stdErr = means[drawn], stdErrs[drawn]
 fig.gca().plot(logConc,cts1,'o',label="Sample 1")
 fig.gca().plot(logConc,cts2,'o',label="Sample 2")
-mean = np.mean(cts1+cts2)
-stdErr = np.std(cts1+cts2, ddof=1)/(len(cts1+cts2))**0.5
-print("{0:.1f} +- {1:.1f}".format(mean,stdErr))
+#Bootstrap of the same cleaned replicate wells, rejected ones (NaN) left out of every mean
+aOris, aTers, cPeriodSamples = bootstrap(cleanReplicates(oriReplicates),cleanReplicates(terReplicates),
+                                        concentrations,taus[:,None],nResamples=100000,seed=0)
+lows, highs = confidenceInterval(meanStdErr(cPeriodSamples)[0])
+for name,m,e,low,high in zip(names,means,stdErrs,lows,highs):
+    print("{0}: {1:.1f} +- {2:.1f}, bootstrap 95% interval: {3:.1f} - {4:.1f}".format(name,m,e,low,high))
 plt.xlabel("$log_2(C)$",fontsize=30)
 plt.ylabel("$C$ period (min)",fontsize=30)
 plt.axhline(mean,label="$\\bar C = ${0:.0f} $\pm$ {1:.0f}".format(mean,stdErr))
@@ -0,0 +1,463 @@
+import numpy as np
+import os
+import hashlib
+import json
+import zipfile
+import xml.etree.ElementTree as ET
+import glob
+import tempfile
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+from QPCRPlate import Plate, standardCurves
+
+def parseRows(rows,lineNumbers,nColumns,filePath,sep=","):
+    '''
+    len(rows) x nColumns array of the numbers in rows of sep separated text,
+    converted in a single call. Raises a ValueError naming the file and line
+    of the first row that does not hold exactly nColumns numbers.
+    '''
+    try:
+        values = np.fromstring(sep.join(rows),sep=sep)
+    except ValueError:
+        values = np.zeros(0)
+    if len(values) == len(rows)*nColumns:
+        return values.reshape(len(rows),nColumns)
+    #Only now look for the culprit, one row at a time
+    for row,lineNumber in zip(rows,lineNumbers):
+        try:
+            n = len(np.fromstring(row,sep=sep))
+        except ValueError:
+            n = -1
+        if n != nColumns or row.count(sep) != nColumns-1:
+            raise ValueError("{0} line {1}: expected {2} numbers in {3!r}".format(filePath,lineNumber,nColumns,row))
+    raise ValueError("{0}: expected {1} numbers in each of lines {2} to {3}".format(filePath,nColumns,lineNumbers[0],lineNumbers[-1]))
+
+def readTextPlate(filePath):
+    '''
+    Reads a plate exported by the LC96 software as a utf16 tab separated file.
+    The file is decoded once and the numeric block converted in a single call.
+    '''
+    f = open(filePath,"rb")
+    text = f.read().decode("utf-16")
+    f.close()
+    header, _, body = text.partition("\n")
+    header = header.rstrip().partition("\t")[2]
+    cycles = parseRows([header],[1],header.count("\t")+1,filePath,sep="\t")[0]
+    lines = [(n,line) for n,line in enumerate(body.splitlines(),2) if line.strip()]
+    lineNumbers = [n for n,line in lines]
+    labels, _, values = zip(*[line.partition("\t") for n,line in lines])
+    ys = parseRows(values,lineNumbers,len(cycles),filePath,sep="\t")
+    #Labels look like "A1 SYBR Green I"
+    wells, _, dyes = np.char.partition(np.asarray(labels,dtype=str)," ").T
+    return Plate(ys,wells,cycles=cycles,dyes=dyes,name=os.path.split(filePath)[1])
+
+def plateLabel(index,labelType):
+    '''
+    Row or column label for a zero based index in an RDML label style
+    ("ABC" for letters, "123" for numbers)
+    '''
+    if labelType == "ABC":
+        label = ""
+        index += 1
+        while index > 0:
+            index, remainder = divmod(index-1,26)
+            label = chr(ord("A")+remainder) + label
+        return label
+    return str(index+1)
+
+def readLC96Plate(filePath):
+    '''
+    Reads the amplification data of a Roche LC96 run file (.lc96p), one row per
+    reaction and dye (each <data> element of a <react>). The zipped
+    rdml_data.xml is parsed incrementally and every data point and reaction is
+    emptied as soon as it has been read, so the DOM is never held in memory.
+    Note the instrument file holds raw fluorescence, not baseline subtracted values.
+    '''
+    archive = zipfile.ZipFile(filePath)
+    stream = archive.open("rdml_data.xml")
+    rows, columns = 8, 12
+    rowLabel, columnLabel = "ABC", "123"
+    reactIds = []
+    dyes = []
+    ys = []
+    cycles = None
+    dataCycles = []
+    dataYs = []
+    reactDyes = []
+    reactYs = []
+    dye = ""
+    for event, elem in ET.iterparse(stream,events=("end",)):
+        tag = elem.tag.rsplit("}",1)[-1]
+        if tag == "fluor":
+            fluor = elem.text
+        elif tag == "cyc":
+            cyc = elem.text
+        elif tag == "adp":
+            dataCycles.append(float(cyc))
+            dataYs.append(float(fluor))
+            elem.clear()
+        elif tag == "mdp":
+            elem.clear()
+        elif tag == "tar":
+            dye = elem.get("id","").split("@")[0]
+        elif tag == "data":
+            #Data without amplification points (e.g. melt only) is not a row
+            if len(dataYs) > 0:
+                if cycles is None:
+                    cycles = dataCycles
+                reactDyes.append(dye)
+                reactYs.append(dataYs)
+            dataCycles = []
+            dataYs = []
+            dye = ""
+        elif tag == "react":
+            reactIds.extend([int(elem.get("id"))]*len(reactYs))
+            dyes.extend(reactDyes)
+            ys.extend(reactYs)
+            reactDyes = []
+            reactYs = []
+            #Finished with this reaction so empty it
+            elem.clear()
+        elif tag == "rows":
+            rows = int(elem.text)
+        elif tag == "columns":
+            columns = int(elem.text)
+        elif tag == "rowLabel":
+            rowLabel = elem.text.strip()
+        elif tag == "columnLabel":
+            columnLabel = elem.text.strip()
+    stream.close()
+    archive.close()
+    wells = [plateLabel((i-1)//columns,rowLabel) + plateLabel((i-1)%columns,columnLabel) for i in reactIds]
+    return Plate(ys,wells,cycles=cycles,dyes=dyes,name=os.path.split(filePath)[1])
+
+def readPlate(filePath,cache=None):
+    '''
+    Loads a plate from either an exported .txt file or an LC96 .lc96p run file,
+    going through a PlateCache if one is given
+    '''
+    if cache is not None:
+        return cache.load(filePath)
+    if os.path.splitext(filePath)[1].lower() == ".lc96p":
+        return readLC96Plate(filePath)
+    return readTextPlate(filePath)
+
+def readCtFile(filePath):
+    '''
+    Replicate cts of a "<condition>_<sample>.csv" file as a targets x replicates
+    x dilutions array. Each target (ori then ter) is a block of comma and tab
+    separated rows, blocks are separated by blank lines.
+    '''
+    f = open(filePath)
+    text = f.read()
+    f.close()
+    #(line number, line) of each block, blank (or whitespace only) lines separate blocks
+    blocks = [[]]
+    for n,line in enumerate(text.replace("\r","").split("\n"),1):
+        if not line.strip():
+            blocks.append([])
+        else:
+            blocks[-1].append((n,line))
+    blocks = [block for block in blocks if block]
+    nRows = max(len(block) for block in blocks)
+    nColumns = len(blocks[0][0][1].split(","))
+    cts = np.full((len(blocks),nRows,nColumns),np.nan)
+    for k,block in enumerate(blocks):
+        lineNumbers, lines = zip(*block)
+        cts[k,:len(block)] = parseRows(lines,lineNumbers,nColumns,filePath)
+    return cts
+
+class PlateCache(object):
+    '''
+    On disk cache of parsed plates keyed by the content hash of the source file
+    and the parser version. The fluorescence matrix is stored as a .npy file that
+    is memory mapped on later loads and the well metadata sits in a .npz sidecar
+    next to it. Several processes may share a cache: files are written under
+    unique temporary names and the index and entries only change under a lock.
+    '''
+
+    #Bump whenever the readers change what they return so old entries miss
+    version = 3
+
+    def __init__(self,directory=None,maxBytes=256*2**20):
+        '''
+        Constructor for a cache in directory holding at most maxBytes of plates
+        '''
+        if directory is None:
+            directory = os.path.join(os.path.expanduser("~"),".cache","QPCR_Analyser")
+        self.directory = directory
+        self.maxBytes = maxBytes
+        os.makedirs(self.directory,exist_ok=True)
+        self.indexPath = os.path.join(self.directory,"index.json")
+        self.lockPath = os.path.join(self.directory,"lock")
+
+    def hashFile(self,filePath):
+        '''
+        sha1 of the cache version and the file contents
+        '''
+        h = hashlib.sha1("QPCR_Analyser plate cache {0}\n".format(self.version).encode())
+        f = open(filePath,"rb")
+        for chunk in iter(lambda: f.read(2**20),b""):
+            h.update(chunk)
+        f.close()
+        return h.hexdigest()
+
+    def entryPaths(self,key):
+        return os.path.join(self.directory,key+".npy"), os.path.join(self.directory,key+".npz")
+
+    def lock(self):
+        '''
+        Takes the cache's exclusive lock, returns the open lock file to unlock.
+        Where fcntl is missing (Windows) only the unique temporary files guard
+        concurrent use.
+        '''
+        f = open(self.lockPath,"a")
+        if fcntl is not None:
+            fcntl.flock(f.fileno(),fcntl.LOCK_EX)
+        return f
+
+    def unlock(self,f):
+        if fcntl is not None:
+            fcntl.flock(f.fileno(),fcntl.LOCK_UN)
+        f.close()
+
+    def load(self,filePath):
+        '''
+        Returns the plate for filePath, parsing and storing it on a miss
+        '''
+        key = self.hashFile(filePath)
+        dataPath, metaPath = self.entryPaths(key)
+        name = os.path.split(filePath)[1]
+        lock = self.lock()
+        try:
+            if os.path.exists(dataPath) and os.path.exists(metaPath):
+                try:
+                    plate = self.readEntry(dataPath,metaPath,name)
+                    #Mark as recently used for eviction
+                    os.utime(dataPath)
+                    self.recordSource(filePath,key)
+                    return plate
+                except (OSError,ValueError,KeyError):
+                    self.removeEntry(key)
+        finally:
+            self.unlock(lock)
+        #Parse outside the lock so processes only wait on each other's writes
+        if os.path.splitext(filePath)[1].lower() == ".lc96p":
+            plate = readLC96Plate(filePath)
+        else:
+            plate = readTextPlate(filePath)
+        lock = self.lock()
+        try:
+            self.store(filePath,key,plate)
+            return self.readEntry(dataPath,metaPath,name)
+        finally:
+            self.unlock(lock)
+
+    def readEntry(self,dataPath,metaPath,name):
+        '''
+        Plate whose fluorescence is a read only memory map of the cached array.
+        Files with the same contents share an entry so the name is the caller's.
+        '''
+        fluorescence = np.load(dataPath,mmap_mode="r")
+        meta = np.load(metaPath)
+        plate = Plate(fluorescence,meta["wells"],cycles=meta["cycles"],dyes=meta["dyes"],name=name)
+        meta.close()
+        return plate
+
+    def writeFile(self,path,write):
+        '''
+        Writes path through a uniquely named temporary file in the cache
+        directory, so readers and other writers never see half a file
+        '''
+        handle, tempPath = tempfile.mkstemp(dir=self.directory,suffix=".tmp")
+        try:
+            f = os.fdopen(handle,"wb")
+            write(f)
+            f.close()
+            os.replace(tempPath,path)
+        except BaseException:
+            try:
+                os.remove(tempPath)
+            except OSError:
+                pass
+            raise
+
+    def store(self,filePath,key,plate):
+        '''
+        Writes a plate to the cache, replacing any entry from an older version
+        of the same source file, then evicts down to the size limit. Called
+        with the lock held.
+        '''
+        dataPath, metaPath = self.entryPaths(key)
+        self.writeFile(metaPath,lambda f: np.savez(f,wells=plate.wells,dyes=plate.dyes,cycles=plate.cycles))
+        self.writeFile(dataPath,lambda f: np.save(f,plate.fluorescence))
+        self.recordSource(filePath,key)
+        self.evict(keep=key)
+
+    def recordSource(self,filePath,key):
+        '''
+        Remembers which entry a source file maps to. When the file has changed
+        the entry of its old contents is dropped unless another file uses it.
+        Called with the lock held.
+        '''
+        index = self.readIndex()
+        source = os.path.abspath(filePath)
+        oldKey = index.get(source)
+        if oldKey == key:
+            return
+        if oldKey is not None and oldKey not in [k for s,k in index.items() if s != source]:
+            self.removeEntry(oldKey)
+        index[source] = key
+        self.writeIndex(index)
+
+    def removeEntry(self,key):
+        for path in self.entryPaths(key):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def readIndex(self):
+        try:
+            f = open(self.indexPath)
+            index = json.load(f)
+            f.close()
+        except (OSError,ValueError):
+            index = {}
+        return index
+
+    def writeIndex(self,index):
+        self.writeFile(self.indexPath,lambda f: f.write(json.dumps(index).encode()))
+
+    def evict(self,keep=None):
+        '''
+        Removes least recently used entries, never keep, until the cache fits in
+        maxBytes. Called with the lock held.
+        '''
+        entries = []
+        total = 0
+        for name in os.listdir(self.directory):
+            if name.endswith(".npy"):
+                key = name[:-4]
+                dataPath, metaPath = self.entryPaths(key)
+                try:
+                    size = os.path.getsize(dataPath) + os.path.getsize(metaPath)
+                    entries.append((os.path.getmtime(dataPath),key,size))
+                except OSError:
+                    continue
+                total += size
+        entries.sort()
+        evictable = [entry for entry in entries if entry[1] != keep]
+        while total > self.maxBytes and len(evictable) > 0:
+            used, key, size = evictable.pop(0)
+            entries.remove((used,key,size))
+            self.removeEntry(key)
+            total -= size
+        index = self.readIndex()
+        kept = set(key for used,key,size in entries)
+        self.writeIndex({source:key for source,key in index.items() if key in kept})
+
+class CtSets(object):
+    '''
+    Replicate cts of every <condition>_<sample>.csv file of a directory held as
+    one conditions x samples x targets x replicates x dilutions array, NaN where
+    a condition has fewer samples or a sample fewer replicates. Files already
+    read are kept per path, so loading a directory again only parses the files
+    that are new or changed. Summary statistics are kept apart from the cts and
+    worked out once until the cts change.
+    '''
+    targets = ["ori","ter"]
+
+    def __init__(self,directory=None):
+        '''
+        Constructor for an empty set, filled from directory if one is given
+        '''
+        self.files = {}
+        self.conditions = []
+        self.samples = []
+        self.cts = np.full((0,0,len(self.targets),0,0),np.nan)
+        self._summaries = {}
+        if directory is not None:
+            self.load(directory)
+
+    def load(self,directory):
+        '''
+        Reads the new or changed csv files of directory, forgets the ones no
+        longer there and rebuilds the array
+        '''
+        filePaths = sorted(glob.glob(os.path.join(directory,"*.csv")))
+        gone = set(self.files) - set(filePaths)
+        for filePath in gone:
+            del self.files[filePath]
+        changed = len(gone) > 0
+        for filePath in filePaths:
+            stat = os.stat(filePath)
+            known = self.files.get(filePath)
+            if known is not None and known[0] == (stat.st_mtime,stat.st_size):
+                continue
+            self.files[filePath] = ((stat.st_mtime,stat.st_size),readCtFile(filePath))
+            changed = True
+        if changed:
+            self.build()
+
+    def build(self):
+        '''
+        Stacks the per file arrays, condition and sample names coming from the
+        file names. Every array is checked before any of the set changes.
+        '''
+        for filePath in sorted(self.files):
+            a = self.files[filePath][1]
+            if a.shape[0] != len(self.targets):
+                raise ValueError("{0} has {1} blocks of cts, expected one per target ({2})".format(
+                                filePath,a.shape[0],", ".join(self.targets)))
+        conditions = []
+        samples = []
+        names = []
+        for filePath in sorted(self.files):
+            condition, _, sample = os.path.splitext(os.path.split(filePath)[1])[0].rpartition("_")
+            if condition == "":
+                condition, sample = sample, "1"
+            if condition not in conditions:
+                conditions.append(condition)
+                samples.append([])
+            samples[conditions.index(condition)].append(sample)
+            names.append((conditions.index(condition),len(samples[conditions.index(condition)])-1,filePath))
+        arrays = [self.files[filePath][1] for c,s,filePath in names]
+        shape = (len(conditions),max([len(s) for s in samples] + [0]),len(self.targets),
+                max([a.shape[1] for a in arrays] + [0]),max([a.shape[2] for a in arrays] + [0]))
+        cts = np.full(shape,np.nan)
+        for (c,s,filePath),a in zip(names,arrays):
+            cts[c,s,:,:a.shape[1],:a.shape[2]] = a
+        self.conditions, self.samples, self.cts = conditions, samples, cts
+        self._summaries = {}
+
+    def condition(self,name,samples=None):
+        '''
+        samples x targets x replicates x dilutions cts of a condition, all of its
+        samples or the named ones
+        '''
+        c = self.conditions.index(name)
+        if samples is None:
+            return self.cts[c,:len(self.samples[c])]
+        return self.cts[c,[self.samples[c].index(s) for s in samples]]
+
+    def summary(self,concentrations):
+        '''
+        Replicate means and ddof=1 standard deviations of every sample and target
+        (conditions x samples x targets x dilutions), with the slope and
+        intercept of the standard curve through the means, as a dict
+        '''
+        key = tuple(concentrations)
+        if key not in self._summaries:
+            valid = np.isfinite(self.cts)
+            n = valid.sum(axis=-2)
+            x = np.where(valid,self.cts,0.0)
+            with np.errstate(invalid='ignore',divide='ignore'):
+                means = x.sum(axis=-2)/n
+                deviations = np.where(valid,self.cts - means[...,None,:],0.0)
+                stds = np.sqrt((deviations*deviations).sum(axis=-2)/(n - 1))
+            slopes, intercepts = standardCurves(means,concentrations)[:2]
+            self._summaries[key] = {"means":means,"stds":stds,"slopes":slopes,"intercepts":intercepts}
+        return self._summaries[key]
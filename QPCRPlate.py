@@ -0,0 +1,625 @@
+import numpy as np
+import warnings
+from scipy.optimize import minimize_scalar
+from SigmoidFit import fitSigmoids
+
+def fitFromSums(n,sx,sy,sxx,sxy,syy):
+    '''
+    Least squares line from precomputed regression sums. All arguments broadcast
+    against each other. Returns slopes, intercepts and r squared values.
+    '''
+    with np.errstate(divide='ignore',invalid='ignore'):
+        dxx = sxx - sx*sx/n
+        dxy = sxy - sx*sy/n
+        dyy = syy - sy*sy/n
+        slope = dxy/dxx
+        intercept = (sy - slope*sx)/n
+        rSquared = (dxy*dxy)/(dxx*dyy)
+    return slope, intercept, rSquared
+
+def linearFit(x,y,mask=None):
+    '''
+    Fits y = slope*x + intercept along the last axis of the (broadcast) inputs.
+    Points where mask is False are left out of the fit.
+    '''
+    x, y = np.broadcast_arrays(np.asarray(x,dtype=float),np.asarray(y,dtype=float))
+    if mask is None:
+        w = np.ones(x.shape)
+    else:
+        w = np.broadcast_to(mask,x.shape).astype(float)
+    x = np.where(w > 0,x,0.0)
+    y = np.where(w > 0,y,0.0)
+    n = w.sum(axis=-1)
+    sx = (w*x).sum(axis=-1)
+    sy = (w*y).sum(axis=-1)
+    sxx = (w*x*x).sum(axis=-1)
+    sxy = (w*x*y).sum(axis=-1)
+    syy = (w*y*y).sum(axis=-1)
+    return fitFromSums(n,sx,sy,sxx,sxy,syy)
+
+def standardCurve(cts,concentrations):
+    '''
+    Standard curve of log10(concentration) against ct, as plotted by the analyser.
+    Returns slope, intercept, r squared and percentage efficiency.
+    '''
+    slope, intercept, rSquared = linearFit(cts,np.log10(concentrations))
+    efficiency = ((10**(-1.0*slope)) - 1)*100
+    return slope, intercept, rSquared, efficiency
+
+def standardCurves(cts,concentrations):
+    '''
+    Standard curves (ct against log10(concentration)) of every dilution series in
+    a ct array whose last axis runs over the dilutions, e.g. thresholds x
+    replicates x dilutions. NaN cts are left out of their series. The sums over
+    the concentrations are shared by all series.
+    Returns slopes, intercepts, r squared values, standard errors of the slopes
+    and percentage efficiencies (10**(-1/slope) - 1), each of shape cts.shape[:-1].
+    '''
+    cts = np.asarray(cts,dtype=float)
+    x = np.log10(np.asarray(concentrations,dtype=float))
+    valid = np.isfinite(cts)
+    w = valid.astype(float)
+    y = np.where(valid,cts,0.0)
+    n = w.sum(axis=-1)
+    sx, sxx = np.dot(w,x), np.dot(w,x*x)
+    sy, sxy, syy = y.sum(axis=-1), np.dot(y,x), (y*y).sum(axis=-1)
+    slopes, intercepts, rSquareds = fitFromSums(n,sx,sy,sxx,sxy,syy)
+    with np.errstate(divide='ignore',invalid='ignore'):
+        dxx = sxx - sx*sx/n
+        residuals = (syy - sy*sy/n) - slopes*slopes*dxx
+        stdErrs = np.sqrt(np.maximum(residuals,0.0)/((n-2)*dxx))
+        efficiencies = (10**(-1.0/slopes) - 1)*100
+    return slopes, intercepts, rSquareds, stdErrs, efficiencies
+
+def deltaGDeltaH(distances,hs):
+    '''
+    Pairwise differences in genome distance (Delta G) and crossing cycle (Delta H)
+    for every pair of samples, ordered by distance. Returns the differences, the
+    fitted line, the slope of a fit through the origin and the median ratio.
+    hs may have leading dimensions (e.g. thresholds x samples), the pairs are
+    built once and every statistic is reduced along the last axis.
+    '''
+    order = np.argsort(distances,kind="stable")
+    distances = np.asarray(distances,dtype=float)[order]
+    hs = np.asarray(hs,dtype=float)[...,order]
+    i, j = np.triu_indices(len(distances),k=1)
+    xs = distances[j] - distances[i]
+    ys = hs[...,j] - hs[...,i]
+    slope, intercept, rSquared = linearFit(xs,ys)
+    originSlope = np.dot(ys,xs)/np.dot(xs,xs)
+    with np.errstate(divide='ignore',invalid='ignore'):
+        median = np.median(ys/xs,axis=-1)
+    return xs, ys, slope, intercept, rSquared, originSlope, median
+
+def previousValidIndex(logFluorescence):
+    '''
+    Index of the last finite point strictly before each cycle (-1 if none)
+    '''
+    valid = np.isfinite(logFluorescence)
+    last = np.maximum.accumulate(np.where(valid,np.arange(valid.shape[-1]),-1),axis=-1)
+    return np.concatenate((np.full(valid.shape[:-1]+(1,),-1),last[...,:-1]),axis=-1)
+
+def thresholdCrossings(cycles,logFluorescence,thresholds,previousValid=None,chunkSize=2**22):
+    '''
+    Ct matrix for many thresholds at once. The (thresholds x wells x cycles)
+    comparison is broadcast in chunks of about chunkSize elements. Each well's
+    crossing is interpolated linearly from the previous finite point and is NaN
+    where the well never crosses. Returns an array of shape thresholds.shape + (wells,)
+    '''
+    logY = np.asarray(logFluorescence,dtype=float)
+    cycles = np.asarray(cycles,dtype=float)
+    thresholds = np.asarray(thresholds,dtype=float)
+    if previousValid is None:
+        previousValid = previousValidIndex(logY)
+    nWells, nCycles = logY.shape
+    flat = thresholds.reshape(-1)
+    cts = np.empty((len(flat),nWells))
+    rows = np.arange(nWells)
+    step = max(1,chunkSize//max(1,nWells*nCycles))
+    for start in range(0,len(flat),step):
+        t = flat[start:start+step]
+        with np.errstate(invalid='ignore'):
+            above = logY > t[:,None,None]
+        j = above.argmax(axis=-1)
+        i = previousValid[rows,j]
+        crossed = np.take_along_axis(above,j[...,None],axis=-1)[...,0] & (i >= 0)
+        i = np.where(crossed,i,0)
+        x1, x2 = cycles[i], cycles[j]
+        y1, y2 = logY[rows,i], logY[rows,j]
+        with np.errstate(divide='ignore',invalid='ignore'):
+            m = (y2-y1)/(x2-x1)
+            ct = x2 + (t[:,None]-y2)/m
+        cts[start:start+step] = np.where(crossed,ct,np.nan)
+    return cts.reshape(thresholds.shape+(nWells,))
+
+class CrossingIndex(object):
+    '''
+    Per well index for the first crossing of any threshold. A well first rises
+    above t where its running maximum (first passage envelope) does, and the
+    envelope is sorted, so each crossing is a searchsorted into its well's
+    envelope, done for all wells at once as a bisection, plus one interpolation
+    from the segment endpoints stored with it. Gives the same cts as
+    thresholdCrossings in log2(cycles) steps per well.
+    '''
+
+    def __init__(self,cycles,logFluorescence,previousValid=None):
+        logY = np.asarray(logFluorescence,dtype=float)
+        self.cycles = np.asarray(cycles,dtype=float)
+        if previousValid is None:
+            previousValid = previousValidIndex(logY)
+        self.nWells, self.nCycles = logY.shape
+        #NaN before a well's first finite point never cross
+        envelope = np.fmax.accumulate(logY,axis=1)
+        self.envelope = np.where(np.isfinite(envelope),envelope,-np.inf).ravel()
+        #Segment ending at each cycle, starting at the previous finite point
+        self.crossable = np.isfinite(logY) & (previousValid >= 0)
+        previous = np.maximum(previousValid,0)
+        self.x1 = self.cycles[previous]
+        self.y1 = np.take_along_axis(logY,previous,axis=1)
+        self.y2 = logY
+
+    def bisect(self,t,start):
+        '''
+        Envelope points at or below t for the wells starting at start, found by
+        a bisection over every well at once
+        '''
+        low = np.zeros(t.shape,dtype=int)
+        high = np.full(t.shape,self.nCycles,dtype=int)
+        for step in range(int(np.ceil(np.log2(self.nCycles + 1)))):
+            middle = (low + high)//2
+            #A NaN threshold is never below, ending on the uncrossable cycle 0
+            below = (middle < self.nCycles) & (self.envelope[start + np.minimum(middle,self.nCycles-1)] <= t)
+            low = np.where(below,middle + 1,low)
+            high = np.where(below,high,middle)
+        return low
+
+    def countBelow(self,thresholds,rows):
+        '''
+        Envelope points at or below each of many thresholds. Every envelope point
+        is placed among the sorted thresholds once and the counts are running
+        sums of those places, so a sweep costs cycles + thresholds per well.
+        '''
+        flat = thresholds.ravel()
+        order = np.argsort(flat,kind="stable")
+        nT = len(flat)
+        places = np.searchsorted(flat[order],self.envelope.reshape(self.nWells,self.nCycles)[rows],side='left')
+        bins = places + (nT + 1)*np.arange(len(rows))[:,None]
+        counts = np.bincount(bins.ravel(),minlength=(nT + 1)*len(rows)).reshape(len(rows),nT + 1)
+        counts = np.cumsum(counts[:,:nT],axis=1)
+        low = np.empty((nT,len(rows)),dtype=int)
+        low[order] = counts.T
+        #NaN thresholds sort last, like the bisection they end on cycle 0
+        low[np.isnan(flat)] = 0
+        return low.reshape(thresholds.shape+(len(rows),))
+
+    def cts(self,thresholds,rows=None):
+        '''
+        Ct of every well (or the given rows) at each log2 threshold. Returns an
+        array of shape thresholds.shape + (wells,), NaN where a well never crosses.
+        '''
+        thresholds = np.asarray(thresholds,dtype=float)
+        rows = np.arange(self.nWells) if rows is None else np.asarray(rows,dtype=int)
+        t = np.broadcast_to(thresholds[...,None],thresholds.shape+(len(rows),))
+        start = rows*self.nCycles
+        #Number of envelope points at or below t, i.e. searchsorted(side='right')
+        #per well, which is where the well first rises above t
+        if thresholds.size > np.log2(self.nCycles + 1):
+            low = self.countBelow(thresholds,rows)
+        else:
+            low = self.bisect(t,start)
+        j = np.minimum(low,self.nCycles-1)
+        flat = start + j
+        crossed = (low < self.nCycles) & self.crossable.ravel()[flat]
+        x1, x2 = self.x1.ravel()[flat], self.cycles[j]
+        y1, y2 = self.y1.ravel()[flat], self.y2.ravel()[flat]
+        with np.errstate(divide='ignore',invalid='ignore'):
+            m = (y2-y1)/(x2-x1)
+            ct = x2 + (t-y2)/m
+        return np.where(crossed,ct,np.nan)
+
+def slidingWindowFits(cycles,logFluorescence,sizes=range(3,10)):
+    '''
+    Line fits to every window of consecutive cycles for each window size, from
+    prefix sums so no window is fitted on its own. Returns slopes, intercepts and
+    r squared values of shape wells x sizes x window start, NaN where a window
+    runs off the end or contains a non positive point.
+    '''
+    logY = np.asarray(logFluorescence,dtype=float)
+    valid = np.isfinite(logY)
+    #Centre the cycles to keep the sums well conditioned
+    x = np.broadcast_to(np.asarray(cycles,dtype=float) - np.mean(cycles),logY.shape)
+    y = np.where(valid,logY,0.0)
+    w = valid.astype(float)
+    sums = [np.concatenate((np.zeros(logY.shape[:-1]+(1,)),np.cumsum(v,axis=-1)),axis=-1)
+            for v in (w,w*x,y,w*x*x,w*x*y,y*y)]
+    nCycles = logY.shape[-1]
+    shape = logY.shape[:-1]+(len(sizes),nCycles)
+    slopes, intercepts, rSquareds = np.full(shape,np.nan), np.full(shape,np.nan), np.full(shape,np.nan)
+    for k,size in enumerate(sizes):
+        if size > nCycles:
+            continue
+        n, sx, sy, sxx, sxy, syy = [s[...,size:] - s[...,:-size] for s in sums]
+        slope, intercept, rSquared = fitFromSums(n,sx,sy,sxx,sxy,syy)
+        full = n == size
+        starts = nCycles - size + 1
+        slopes[...,k,:starts] = np.where(full,slope,np.nan)
+        #Intercept back in uncentred cycles
+        with np.errstate(invalid='ignore'):
+            intercepts[...,k,:starts] = np.where(full,intercept - slope*np.mean(cycles),np.nan)
+        rSquareds[...,k,:starts] = np.where(full,rSquared,np.nan)
+    return slopes, intercepts, rSquareds
+
+def baselineWindows(fluorescence,skip=2,minPoints=3,noiseCycles=8,noiseMultiple=10.0,runLength=3,margin=1):
+    '''
+    Baseline window [start,end) of each well. Amplification starts at the first
+    of runLength cycles in a row that rise more than noiseMultiple times the
+    median step size of the noiseCycles after skip above the running minimum
+    of the curve. The window runs from cycle skip
+    to margin cycles before that, the whole curve for wells that never amplify,
+    and is at least minPoints long.
+    '''
+    ys = np.atleast_2d(np.asarray(fluorescence,dtype=float))
+    nCycles = ys.shape[1]
+    steps = np.abs(np.diff(ys[:,skip:skip+noiseCycles+1],axis=1))
+    measured = np.isfinite(steps).any(axis=1)
+    noise = np.full(len(ys),np.inf)
+    noise[measured] = np.nanmedian(steps[measured],axis=1)
+    with np.errstate(invalid='ignore'):
+        rising = ys - np.fmin.accumulate(ys,axis=1) > noiseMultiple*noise[:,None]
+    #Runs of rising cycles from prefix sums, onset is the first full run
+    counts = np.concatenate((np.zeros((len(ys),1),dtype=int),np.cumsum(rising,axis=1)),axis=1)
+    runs = counts[:,runLength:] - counts[:,:-runLength] == runLength
+    if runs.shape[1] == 0:
+        #Curves shorter than a run never amplify
+        onsets = np.full(len(ys),nCycles + margin)
+    else:
+        onsets = np.where(runs.any(axis=1),runs.argmax(axis=1),nCycles + margin)
+    starts = np.full(len(ys),min(skip,max(nCycles - minPoints,0)))
+    ends = np.clip(onsets - margin,starts + minPoints,nCycles)
+    return starts, ends
+
+def baselines(cycles,fluorescence,**options):
+    '''
+    Linear baseline of every well fitted over its baseline window (see
+    baselineWindows for the options). Returns slopes, intercepts and the windows.
+    '''
+    ys = np.atleast_2d(np.asarray(fluorescence,dtype=float))
+    cycles = np.asarray(cycles,dtype=float)
+    starts, ends = baselineWindows(ys,**options)
+    j = np.arange(ys.shape[1])
+    inside = (j >= starts[:,None]) & (j < ends[:,None]) & np.isfinite(ys)
+    slopes, intercepts, rSquareds = linearFit(cycles,ys,inside)
+    #A single point or flat window still has a level
+    with np.errstate(invalid='ignore'):
+        level = np.where(inside,ys,0.0).sum(axis=1)/inside.sum(axis=1)
+    slopes = np.where(np.isfinite(slopes),slopes,0.0)
+    intercepts = np.where(np.isfinite(intercepts),intercepts,level)
+    return slopes, intercepts, starts, ends
+
+class Plate(object):
+    '''
+    Qt free store of a single QPCR plate. Fluorescence is held as one contiguous
+    wells x cycles array and all analysis is done with array operations.
+    '''
+
+    def __init__(self,fluorescence,wells,cycles=None,dyes=None,name=None):
+        '''
+        Constructor for a plate from a wells x cycles array and matching well names
+        '''
+        self.fluorescence = np.ascontiguousarray(fluorescence,dtype=float)
+        if self.fluorescence.ndim != 2 or self.fluorescence.shape[0] != len(wells):
+            raise ValueError("Fluorescence must be a wells x cycles array")
+        if cycles is None:
+            cycles = np.arange(1,self.fluorescence.shape[1]+1)
+        self.cycles = np.asarray(cycles,dtype=float)
+        self.wells = np.asarray(wells,dtype=str)
+        if dyes is None:
+            dyes = [""]*len(self.wells)
+        self.dyes = np.asarray(dyes,dtype=str)
+        self.name = name
+        self.wellIndex = {}
+        for i,well in enumerate(self.wells):
+            self.wellIndex.setdefault(well,i)
+        self._log = None
+        self._efficiencySums = None
+        #Cts of every well at each single threshold already probed
+        self._crossings = {}
+
+    def __len__(self):
+        return self.fluorescence.shape[0]
+
+    @property
+    def logFluorescence(self):
+        '''
+        Log2 of the fluorescence with NaN where the fluorescence is not positive
+        '''
+        if self._log is None:
+            with np.errstate(divide='ignore',invalid='ignore'):
+                self._log = np.where(self.fluorescence > 0,np.log2(self.fluorescence),np.nan)
+            valid = np.isfinite(self._log)
+            self._previousValid = previousValidIndex(self._log)
+            self._crossingIndex = CrossingIndex(self.cycles,self._log,self._previousValid)
+            #Positive points packed to the front of each row (what the GUI plots)
+            self._packed = np.argsort(~valid,axis=1,kind="stable")
+            self._cumulativeValid = np.concatenate((np.zeros((len(self),1),dtype=int),np.cumsum(valid,axis=1)),axis=1)
+        return self._log
+
+    def index(self,wells=None):
+        '''
+        Row indexes of the given well names (or row indexes), all wells if None
+        '''
+        if wells is None:
+            return np.arange(len(self))
+        return np.asarray([self.wellIndex[w] if isinstance(w,str) else w for w in wells],dtype=int)
+
+    def logPoints(self,i):
+        '''
+        Cycles and log2 fluorescence of the positive points of well i
+        '''
+        logY = self.logFluorescence[i]
+        valid = np.isfinite(logY)
+        return self.cycles[valid], logY[valid]
+
+    def cycleEfficiencies(self,wells=None):
+        '''
+        Per cycle efficiency y[j]/y[j-1] - 1 paired with the fluorescence y[j],
+        for cycles[1:]. Returns fluorescence and efficiency arrays of the wells.
+        '''
+        rows = self.index(wells)
+        ys = self.fluorescence[rows]
+        with np.errstate(divide='ignore',invalid='ignore'):
+            efficiencies = ys[:,1:]/ys[:,:-1] - 1.0
+        return ys[:,1:], efficiencies
+
+    def efficiencyFits(self,wells,minXs,maxXs):
+        '''
+        Linear regression of cycle efficiency on fluorescence (LRE) for each well
+        over the cycles in [minX,maxX]. Regression sums of every well are built
+        once as prefix sums, so each fit is a pair of lookups.
+        Returns slopes, intercepts and r squared values.
+        '''
+        if self._efficiencySums is None:
+            fs, es = self.cycleEfficiencies()
+            valid = np.isfinite(fs) & np.isfinite(es)
+            fs = np.where(valid,fs,0.0)
+            es = np.where(valid,es,0.0)
+            self._efficiencySums = np.concatenate((np.zeros((6,len(self),1)),np.cumsum(
+                [valid,fs,es,fs*fs,fs*es,es*es],axis=2)),axis=2)
+        rows = self.index(wells)
+        lo, hi = self.cycleRange(minXs,maxXs)
+        sums = self._efficiencySums[:,rows,hi] - self._efficiencySums[:,rows,lo]
+        return fitFromSums(*sums)
+
+    def cycleRange(self,minXs,maxXs):
+        '''
+        Start and stop positions in cycles[1:] of the cycles in [minX,maxX]
+        '''
+        lo = np.searchsorted(self.cycles[1:],minXs,side="left")
+        hi = np.searchsorted(self.cycles[1:],maxXs,side="right")
+        return lo, np.maximum(hi,lo)
+
+    def concatenate(self,other):
+        '''
+        Returns a new plate with the wells of other appended to this plate
+        '''
+        if len(self.cycles) != len(other.cycles):
+            raise ValueError("Plates have different numbers of cycles")
+        return Plate(np.vstack((self.fluorescence,other.fluorescence)),
+                    np.concatenate((self.wells,other.wells)),cycles=self.cycles,
+                    dyes=np.concatenate((self.dyes,other.dyes)),name=self.name)
+
+    def computeCts(self,thresholds,wells=None):
+        '''
+        Cycle at which each well first crosses the (log2) threshold(s), interpolated
+        linearly from the previous positive point. NaN if a well never crosses.
+        Looked up in the plate's CrossingIndex, built with the log fluorescence.
+        Returns an array of shape thresholds.shape + (wells,)
+        '''
+        self.logFluorescence
+        return self._crossingIndex.cts(thresholds,None if wells is None else self.index(wells))
+
+    def crossings(self,threshold,wells=None):
+        '''
+        Cts of the wells at a single log2 threshold. Every well's ct is kept per
+        threshold so probing a threshold again is a lookup.
+        '''
+        threshold = float(threshold)
+        if threshold not in self._crossings:
+            self._crossings[threshold] = self.computeCts(threshold)
+        cts = self._crossings[threshold]
+        return cts if wells is None else cts[self.index(wells)]
+
+    def logLinearEfficiencies(self,cts,span=4,wells=None):
+        '''
+        Fits a line to span positive log points around each ct (as the GUI does)
+        and returns alphas, slopes, intercepts and the first and last fitted cycle.
+        cts has one entry per well (or per well in wells) and may have extra
+        leading dimensions.
+        '''
+        logY = self.logFluorescence
+        cts = np.asarray(cts,dtype=float)
+        selected = self.index(wells)
+        packedX = self.cycles[self._packed[selected]]
+        packedY = np.take_along_axis(logY[selected],self._packed[selected],axis=1)
+        cumulativeValid = self._cumulativeValid[selected]
+        rows = np.arange(len(selected))[:,None]
+        #Number of positive points at or before the rounded ct
+        with np.errstate(invalid='ignore'):
+            k = np.searchsorted(self.cycles,np.where(np.isfinite(cts),np.round(cts),-np.inf),side='right')
+        index = cumulativeValid[rows[:,0],k]
+        offsets = np.arange(-(span//2),span-span//2)
+        positions = index[...,None] + offsets
+        mask = (positions >= 0) & (positions < cumulativeValid[:,-1:]) & (index[...,None] > 1)
+        positions = np.clip(positions,0,logY.shape[1]-1)
+        x = packedX[rows,positions]
+        y = packedY[rows,positions]
+        slope, intercept, rSquared = linearFit(x,y,mask)
+        ok = (index > 1) & np.isfinite(cts)
+        slope = np.where(ok,slope,np.nan)
+        intercept = np.where(ok,intercept,np.nan)
+        alpha = 2.0**slope - 1.0
+        xStart = np.where(ok,np.where(mask,x,np.inf).min(axis=-1),np.nan)
+        xEnd = np.where(ok,np.where(mask,x,-np.inf).max(axis=-1),np.nan)
+        return alpha, slope, intercept, xStart, xEnd
+
+    def slidingEfficiencies(self,sizes=range(3,10)):
+        '''
+        Efficiency (2**slope - 1) and r squared of every window position and size
+        for every well, as wells x sizes x window start cubes
+        '''
+        slopes, intercepts, rSquareds = slidingWindowFits(self.cycles,self.logFluorescence,sizes)
+        return 2.0**slopes - 1.0, rSquareds
+
+    def bestWindows(self,sizes=range(3,10),cts=None,wells=None):
+        '''
+        Window with the highest r squared for each well among rising windows.
+        If cts are given only windows containing the well's ct are considered.
+        Returns alphas, slopes, intercepts and the first and last window cycle.
+        '''
+        rows = self.index(wells)
+        sizes = np.asarray(list(sizes))
+        slopes, intercepts, rSquareds = slidingWindowFits(self.cycles,self.logFluorescence[rows],sizes)
+        nCycles = len(self.cycles)
+        starts = np.arange(nCycles)
+        ends = np.minimum(starts[None,:] + sizes[:,None] - 1,nCycles-1)
+        score = np.where(slopes > 0,rSquareds,np.nan)
+        if cts is not None:
+            cts = np.asarray(cts,dtype=float)[:,None,None]
+            inside = (self.cycles[starts] <= cts) & (self.cycles[ends] >= cts)
+            score = np.where(inside,score,np.nan)
+        flat = score.reshape(len(rows),-1)
+        found = np.isfinite(flat).any(axis=1)
+        best = np.argmax(np.where(np.isfinite(flat),flat,-np.inf),axis=1)
+        rows = np.arange(len(rows))
+        size, start = np.unravel_index(best,score.shape[1:])
+        slope = np.where(found,slopes[rows,size,start],np.nan)
+        intercept = np.where(found,intercepts[rows,size,start],np.nan)
+        xStart = np.where(found,self.cycles[start],np.nan)
+        xEnd = np.where(found,self.cycles[ends[size,start]],np.nan)
+        return 2.0**slope - 1.0, slope, intercept, xStart, xEnd
+
+    def subtractBaseline(self,**options):
+        '''
+        New plate with each well's fitted linear baseline subtracted, see
+        baselineWindows for the options. The baselines are kept on the new
+        plate as baselineSlopes, baselineIntercepts and baselineWindows.
+        '''
+        slopes, intercepts, starts, ends = baselines(self.cycles,self.fluorescence,**options)
+        plate = Plate(self.fluorescence - (slopes[:,None]*self.cycles + intercepts[:,None]),self.wells,
+                    cycles=self.cycles,dyes=self.dyes,name=self.name)
+        plate.baselineSlopes = slopes
+        plate.baselineIntercepts = intercepts
+        plate.baselineWindows = np.stack((starts,ends),axis=1)
+        return plate
+
+    def sigmoidFits(self,model="4PL",wells=None):
+        '''
+        Logistic, 4PL or 5PL fits of the raw fluorescence of every well (or the
+        given wells) at once, see SigmoidFit.fitSigmoids
+        '''
+        return fitSigmoids(self.cycles,self.fluorescence[self.index(wells)],model)
+
+    def standardCurve(self,wells,threshold,concentrations):
+        '''
+        Standard curve for the given dilution wells at a threshold
+        '''
+        cts = self.computeCts(threshold,wells=wells)
+        return standardCurve(cts,concentrations)
+
+    def standardCurves(self,curves,thresholds,concentrations):
+        '''
+        Standard curves of several dilution series at every threshold at once.
+        curves is a replicates x dilutions nest of wells. Results have shape
+        thresholds.shape + (replicates,), see standardCurves.
+        '''
+        curves = np.asarray(curves)
+        cts = self.computeCts(thresholds,wells=curves.ravel())
+        return standardCurves(cts.reshape(cts.shape[:-1]+curves.shape),concentrations)
+
+    def thresholdScan(self,wells,thresholds,concentrations):
+        '''
+        Standard curve efficiency of the dilution wells and their mean log linear
+        efficiency (both in %) for every threshold in one batched pass
+        '''
+        selected = self.index(wells)
+        cts = self.computeCts(thresholds,wells=selected)
+        slope, intercept, rSquared, curveEfficiencies = standardCurve(cts,concentrations)
+        alphas = self.logLinearEfficiencies(cts,wells=selected)[0]
+        #Mean over the wells that were fitted at each threshold
+        fitted = np.isfinite(alphas)
+        with np.errstate(divide='ignore',invalid='ignore'):
+            linearEfficiencies = 100.0*np.where(fitted,alphas,0.0).sum(axis=-1)/fitted.sum(axis=-1)
+        return curveEfficiencies, linearEfficiencies
+
+    def deltaGDeltaH(self,wells,threshold,distances):
+        '''
+        Delta G Delta H analysis for the given wells at a threshold
+        '''
+        hs = self.computeCts(threshold,wells=wells)
+        return deltaGDeltaH(distances,hs)
+
+    def deltaGDeltaHSweep(self,wells,thresholds,distances):
+        '''
+        Median Delta H/Delta G ratio, fitted slope and r squared of the given
+        wells for every threshold at once
+        '''
+        hs = self.computeCts(thresholds,wells=wells)
+        xs, ys, slope, intercept, rSquared, originSlope, median = deltaGDeltaH(distances,hs)
+        return median, slope, rSquared
+
+    def thresholdObjective(self,threshold,wells,objective="replicates",concentrations=None,distances=None):
+        '''
+        Cost of a log2 threshold for autoThreshold. objective is "replicates" (mean
+        ct variance of groups of replicate wells, wells being a list of groups),
+        "efficiency" (|standard curve efficiency - 100| of the dilution wells) or
+        "distance" (mean squared residual of the Delta H Delta G fit)
+        '''
+        #Groups that never cross and empty standard curves are expected, they cost 1e12 below
+        with np.errstate(invalid='ignore',divide='ignore'), warnings.catch_warnings():
+            warnings.simplefilter("ignore",RuntimeWarning)
+            if objective == "replicates":
+                groups = np.concatenate([[k]*len(group) for k,group in enumerate(wells)]).astype(int)
+                cts = self.crossings(threshold,[w for group in wells for w in group])
+                counts = np.bincount(groups,minlength=len(wells))
+                means = np.bincount(groups,cts,len(wells))/counts
+                variances = np.bincount(groups,(cts - means[groups])**2,len(wells))/(counts - 1)
+                cost = np.mean(variances[counts > 1])
+            elif objective == "efficiency":
+                cost = abs(standardCurve(self.crossings(threshold,wells),concentrations)[3] - 100)
+            elif objective == "distance":
+                xs, ys, slope, intercept, rSquared, originSlope, median = deltaGDeltaH(distances,self.crossings(threshold,wells))
+                cost = np.mean((ys - slope*xs - intercept)**2)
+            else:
+                raise ValueError("Unknown threshold objective " + str(objective))
+        #Thresholds some wells never cross are the worst possible
+        return cost if np.isfinite(cost) else 1e12
+
+    def autoThreshold(self,wells,objective="replicates",concentrations=None,distances=None,
+                    bounds=(np.log2(0.0001),np.log2(0.5)),coarse=16,tolerance=1e-3):
+        '''
+        Log2 threshold minimising thresholdObjective within bounds. A coarse grid
+        of thresholds brackets the best basin, which a bounded Brent search then
+        refines. Returns the threshold, its cost and the number of thresholds probed.
+        '''
+        args = (wells,objective,concentrations,distances)
+        grid = np.linspace(bounds[0],bounds[1],coarse)
+        costs = [self.thresholdObjective(t,*args) for t in grid]
+        k = int(np.argmin(costs))
+        result = minimize_scalar(self.thresholdObjective,bounds=(grid[max(k-1,0)],grid[min(k+1,coarse-1)]),
+                                method="bounded",args=args,options={"xatol":tolerance})
+        if result.fun > costs[k]:
+            return grid[k], costs[k], coarse + result.nfev
+        return result.x, result.fun, coarse + result.nfev
+
+def thresholdScan(plates,wells,thresholds,concentrations):
+    '''
+    Threshold scan of the same dilution wells on several plates. Returns
+    plates x thresholds arrays of standard curve and mean log linear efficiency.
+    '''
+    curveEfficiencies = []
+    linearEfficiencies = []
+    for plate in plates:
+        curve, linear = plate.thresholdScan(wells,thresholds,concentrations)
+        curveEfficiencies.append(curve)
+        linearEfficiencies.append(linear)
+    return np.asarray(curveEfficiencies), np.asarray(linearEfficiencies)
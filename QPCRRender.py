@@ -0,0 +1,214 @@
+import numpy as np
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from QPCRPlate import linearFit, standardCurve, deltaGDeltaH
+from QPCRFiles import readPlate
+from QPCRBatch import findPlates
+
+def drawRaw(ax,plate,wells,labels,rawThresh=None,legend=True):
+    '''
+    Raw fluorescence of the given plate rows, with the threshold line if given
+    '''
+    for i,label in zip(wells,labels):
+        ax.plot(plate.cycles,plate.fluorescence[i],'.--',label=label)
+    if legend:
+        ax.legend()
+    ax.set_xlabel("Cycle number")
+    ax.set_ylabel("Flourescence")
+    if rawThresh != None:
+        ax.axhline(rawThresh,color = 'k')
+
+def drawLog(ax,plate,wells,labels,thresh=None,hs=None,alphas=None,alphaFits=None,showThresh=True,showFits=True,legend=True):
+    '''
+    Log fluorescence of the given plate rows. With a threshold the crossing
+    cycles (hs) and the log linear fits (alphaFits, (x,y) per row or None)
+    are drawn as chosen by showThresh and showFits.
+    '''
+    for k,(i,label) in enumerate(zip(wells,labels)):
+        x, y = plate.logPoints(i)
+        if thresh == None or showFits == False:
+            p = ax.plot(x,y, '.--',label = label)
+        else:
+            p = ax.plot(x,y, '.--')
+        if alphaFits is None or alphaFits[k] is None:
+            alphaX, alphaY = [], []
+        else:
+            alphaX, alphaY = alphaFits[k]
+        if thresh != None:
+            if showFits:
+                ax.plot(alphaX,alphaY,color=p[0].get_color(),label=label + " a= {0:.3}".format(float(alphas[k])))
+            if showThresh:
+                ax.axvline(hs[k],color=p[0].get_color())
+        else:
+            ax.plot(alphaX,alphaY,color=p[0].get_color(),label=label)
+    #Hline at thresh value
+    if thresh != None and showThresh:
+        ax.axhline(thresh,color = 'k')
+    if legend:
+        ax.legend()
+    ax.set_xlabel("Cycle number")
+    ax.set_ylabel("Log Flourescence")
+
+def drawCurve(ax,ctype,cX,cY,cFitX,cFitY):
+    '''
+    Calibration, Delta H Delta G, threshold scan or Delta H Delta G sweep plot
+    from the points and fit the analyser keeps for its third plot
+    '''
+    if ctype == "Callibration":
+        concentrations = 10**np.asarray(cY,dtype=float)
+        slope, intercept, rSquared, efficiency = standardCurve(cX,concentrations)
+        ax.plot(cX,cY,'.',label="Efficiency {0:.4}% R2 {1:.3}".format(efficiency,rSquared))
+        ax.plot(cFitX,cFitY,'--',label="y= {0:.3}x + {1:.3}".format(slope,intercept))
+        ax.set_ylabel("Log(initial concentration)")
+        ax.set_xlabel("ct")
+    elif ctype == "Distance":
+        cX = np.asarray(cX,dtype=float)
+        cY = np.asarray(cY,dtype=float)
+        slope, intercept, rSquared = linearFit(cX,cY)
+        ax.plot(cX,cY,'.')
+        ax.plot(cFitX,cFitY,'--',label="y= {0:.3}x + {1:.3} R2 {2:.4}".format(slope,intercept,rSquared))
+        slope2 = np.dot(cX,cY)/np.dot(cX,cX)
+        ax.plot(cX,cX*slope2, '-', label= "y= {0:.3}x".format(slope2))
+        ax.plot([], [], ' ', label="Median of points: {0:.3}".format(np.median(cY/cX)))
+        ax.set_xlabel("Delta G")
+        ax.set_ylabel("Delta H")
+    elif ctype == "Efficiency":
+        ax.plot(cX,cY,'--',label="Standard curve efficiency")
+        ax.plot(cFitX,cFitY,'--',label="Linear log efficiency")
+        ax.set_xlabel("Threshold value")
+        ax.set_ylabel("Efficiency")
+    elif ctype == "DeltaGDeltaHSweep":
+        ax.plot(cX,cY,'o-',label="Medians")
+        ax.plot(cFitX,cFitY,'o-',label="Rsquared values")
+        ax.set_xlabel("Threshold value")
+        ax.set_ylabel("R squared/ Median")
+    ax.legend()
+
+def packCurves(x,ys,xRange=None,maxPoints=None):
+    '''
+    Packs curves sharing x into single x, y and connect arrays so they can be
+    drawn as one line item. Points outside xRange (bar one either side) are
+    dropped, only every stride'th point is kept when more than maxPoints are in
+    view and non finite points are skipped, joining the curve across them.
+    '''
+    x = np.asarray(x,dtype=float)
+    ys = np.atleast_2d(np.asarray(ys,dtype=float))
+    keep = np.ones(len(x),dtype=bool)
+    if xRange is not None:
+        inside = (x >= xRange[0]) & (x <= xRange[1])
+        keep = inside.copy()
+        keep[1:] |= inside[:-1]
+        keep[:-1] |= inside[1:]
+    columns = np.flatnonzero(keep)
+    if maxPoints is not None and len(columns) > maxPoints:
+        columns = columns[::int(np.ceil(len(columns)/float(maxPoints)))]
+    ys = ys[:,columns]
+    finite = np.isfinite(ys)
+    curve = np.nonzero(finite)[0]
+    #Each point joins the next unless the next starts another curve
+    connect = np.append(curve[:-1] == curve[1:],False) if len(curve) else np.zeros(0,dtype=bool)
+    return np.broadcast_to(x[columns],ys.shape)[finite], ys[finite], connect
+
+def saveFigure(draw,basePath,formats,figsize=(8,6)):
+    '''
+    Draws onto a fresh Agg figure and writes one file per format
+    '''
+    figure = Figure(figsize=figsize)
+    FigureCanvasAgg(figure)
+    draw(figure.add_subplot(111))
+    figure.tight_layout()
+    paths = []
+    for fmt in formats:
+        paths.append(basePath + "." + fmt)
+        figure.savefig(paths[-1])
+    return paths
+
+def renderPlate(filePath,outDir="Graphs",threshold=None,wells=None,curve=None,
+                concentrations=(1.0,0.2,0.04,0.008,0.0016),distanceWells=None,distances=None,
+                formats=("png",),span=4):
+    '''
+    Writes the raw, log and, when wells for them are given, the calibration,
+    threshold scan and Delta H Delta G figures of one plate to outDir.
+    threshold is log2 as in the analyser. Returns the written paths.
+    '''
+    plate = readPlate(filePath)
+    rows = plate.index([w for w in wells if w in plate.wellIndex] if wells else None)
+    labels = [plate.wells[i] + " " + plate.dyes[i] for i in rows]
+    legend = len(rows) <= 24
+    base = os.path.join(outDir,os.path.splitext(os.path.split(filePath)[1])[0])
+    paths = saveFigure(lambda ax: drawRaw(ax,plate,rows,labels,None if threshold is None else 2**threshold,legend),
+                    base+"_raw",formats)
+    if threshold is None:
+        paths += saveFigure(lambda ax: drawLog(ax,plate,rows,labels,legend=legend),base+"_log",formats)
+        return paths
+    hs = plate.computeCts(threshold,wells=rows)
+    alphas, slopes, intercepts, xStarts, xEnds = plate.logLinearEfficiencies(hs,span=span,wells=rows)
+    alphaFits = []
+    for k in range(len(rows)):
+        if np.isfinite(alphas[k]):
+            xFit = np.linspace(xStarts[k],xEnds[k],100)
+            alphaFits.append((xFit,xFit*slopes[k] + intercepts[k]))
+        else:
+            alphaFits.append(None)
+    paths += saveFigure(lambda ax: drawLog(ax,plate,rows,labels,threshold,hs,alphas,alphaFits,legend=legend),
+                    base+"_log",formats)
+    if curve and len(curve) == len(concentrations) and all(w in plate.wellIndex for w in curve):
+        cts = plate.computeCts(threshold,wells=curve)
+        slope, intercept, rSquared, efficiency = standardCurve(cts,concentrations)
+        fitX = np.linspace(min(cts),max(cts),100)
+        paths += saveFigure(lambda ax: drawCurve(ax,"Callibration",cts,np.log10(concentrations),fitX,slope*fitX + intercept),
+                        base+"_calibration",formats)
+        thresholds = np.linspace(0.0001,0.5,200)
+        curveEfficiencies, linearEfficiencies = plate.thresholdScan(curve,np.log2(thresholds),concentrations)
+        paths += saveFigure(lambda ax: drawCurve(ax,"Efficiency",thresholds,curveEfficiencies,thresholds,linearEfficiencies),
+                        base+"_efficiency",formats)
+    if distanceWells and len(distanceWells) == len(distances) and all(w in plate.wellIndex for w in distanceWells):
+        cts = plate.computeCts(threshold,wells=distanceWells)
+        xs, ys, slope, intercept, rSquared, slope2, median = deltaGDeltaH(distances,cts)
+        fitX = np.linspace(0,max(xs),100)
+        paths += saveFigure(lambda ax: drawCurve(ax,"Distance",xs,ys,fitX,slope*fitX + intercept),
+                        base+"_distance",formats)
+    return paths
+
+def renderBatch(files,outDir="Graphs",workers=None,**options):
+    '''
+    Renders every plate's figures over a process pool, returns all written paths
+    '''
+    os.makedirs(outDir,exist_ok=True)
+    paths = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(renderPlate,f,outDir,**options) for f in files]
+        for future in futures:
+            paths.extend(future.result())
+    return paths
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless rendering of QPCR plate figures")
+    parser.add_argument("paths",nargs="+",help="plate files or directories of plates")
+    parser.add_argument("-t","--threshold",type=float,default=None,help="log2 threshold")
+    parser.add_argument("-w","--wells",default=None,help="comma separated wells to plot (default all)")
+    parser.add_argument("-c","--curve",default=None,help="comma separated dilution wells of the standard curve")
+    parser.add_argument("--concentrations",default="1.0,0.2,0.04,0.008,0.0016",
+                        help="comma separated concentrations of the standard curve wells")
+    parser.add_argument("-d","--distance-wells",default=None,help="comma separated wells for the Delta H Delta G plot")
+    parser.add_argument("--distances",default="0.4603,0.02516,0.963,0.0,1.0",
+                        help="comma separated genome distances of the distance wells")
+    parser.add_argument("-f","--format",action="append",default=None,help="png or pdf, may be given several times")
+    parser.add_argument("--span",type=int,default=4,help="points in the log linear fit")
+    parser.add_argument("-j","--workers",type=int,default=None,help="number of processes (default all cores)")
+    parser.add_argument("-o","--out-dir",default="Graphs",help="output directory (default Graphs)")
+    args = parser.parse_args(argv)
+    split = lambda text: text.split(",") if text else None
+    paths = renderBatch(findPlates(args.paths),outDir=args.out_dir,workers=args.workers,
+                        threshold=args.threshold,wells=split(args.wells),curve=split(args.curve),
+                        concentrations=[float(c) for c in args.concentrations.split(",")],
+                        distanceWells=split(args.distance_wells),
+                        distances=[float(d) for d in args.distances.split(",")],
+                        formats=args.format or ["png"],span=args.span)
+    print("Wrote {0} figures to {1}".format(len(paths),args.out_dir))
+
+if __name__ == '__main__':
+    main()
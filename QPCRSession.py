@@ -0,0 +1,198 @@
+import numpy as np
+import os
+from QPCRPlate import Plate
+
+class Session(object):
+    '''
+    Stack of runs held as one runs x wells x cycles array, padded with NaN where
+    a run has fewer wells or cycles, with an index over (run, well, dye).
+    Given a path the array is a memory mapped .npy file with a .npz index next
+    to it, so a session can grow past memory, be reopened later and only the
+    wells asked for are ever read.
+    '''
+
+    def __init__(self,path=None):
+        '''
+        Constructor for an in memory session, or one backed by path (.npy/.npz)
+        which is reopened if it already exists
+        '''
+        self.path = path
+        self.names = []
+        self.wells = []
+        self.dyes = []
+        self.cycles = []
+        self.index = {}
+        self.wellRuns = {}
+        self.data = np.full((0,0,0),np.nan)
+        if path is not None and os.path.exists(path+".npy") and os.path.exists(path+".npz"):
+            self.load()
+
+    def __len__(self):
+        return len(self.names)
+
+    def addPlate(self,plate):
+        '''
+        Appends a plate as a new run and returns its run number
+        '''
+        run = len(self)
+        nWells, nCycles = plate.fluorescence.shape
+        self.reserve(run+1,nWells,nCycles)
+        self.data[run,:nWells,:nCycles] = plate.fluorescence
+        self.names.append(plate.name or "")
+        self.wells.append(np.asarray(plate.wells,dtype=str))
+        self.dyes.append(np.asarray(plate.dyes,dtype=str))
+        self.cycles.append(np.asarray(plate.cycles,dtype=float))
+        self.indexRun(run)
+        if self.path is not None:
+            self.data.flush()
+            self.writeIndex()
+        return run
+
+    def row(self,run,well,dye=None):
+        '''
+        Row of a well in a run, the first with that name if dye is None
+        '''
+        if dye is None:
+            return min(r for n,r in self.wellRuns.get(well,[]) if n == run)
+        return self.index[(run,well,dye)]
+
+    def indexRun(self,run):
+        for row,(well,dye) in enumerate(zip(self.wells[run].tolist(),self.dyes[run].tolist())):
+            self.index.setdefault((run,well,dye),row)
+            self.wellRuns.setdefault(well,[]).append((run,row))
+
+    def reserve(self,runs,wells,cycles):
+        '''
+        Grows the array to hold at least runs x wells x cycles, doubling the
+        number of runs so repeated appends copy rarely
+        '''
+        shape = self.data.shape
+        if runs <= shape[0] and wells <= shape[1] and cycles <= shape[2]:
+            return
+        newShape = (max(runs,2*shape[0]) if runs > shape[0] else shape[0],max(wells,shape[1]),max(cycles,shape[2]))
+        if self.path is None:
+            data = np.full(newShape,np.nan)
+        else:
+            data = np.lib.format.open_memmap(self.path+".npy.tmp",mode="w+",dtype=float,shape=newShape)
+            data[...] = np.nan
+        data[:shape[0],:shape[1],:shape[2]] = self.data
+        if self.path is not None:
+            data.flush()
+            del data
+            self.data = None
+            os.replace(self.path+".npy.tmp",self.path+".npy")
+            data = np.load(self.path+".npy",mmap_mode="r+")
+        self.data = data
+
+    def rows(self,wells=None,runs=None,dyes=None):
+        '''
+        Run and row numbers of every well matching the given names, runs and
+        dyes (any if None), in run order
+        '''
+        if wells is None:
+            wells = self.wellRuns
+        runs = None if runs is None else set(runs)
+        found = []
+        for well in set(wells):
+            for run,row in self.wellRuns.get(well,[]):
+                if (runs is None or run in runs) and (dyes is None or self.dyes[run][row] in dyes):
+                    found.append((run,row))
+        found.sort()
+        return np.asarray([f[0] for f in found],dtype=int), np.asarray([f[1] for f in found],dtype=int)
+
+    def fluorescence(self,runs,rows):
+        '''
+        Fluorescence of the (run,row) wells, reading only those rows
+        '''
+        return np.asarray(self.data[runs,rows])
+
+    def plate(self,run):
+        '''
+        A single run as a plate over a view of the session array
+        '''
+        nWells, nCycles = len(self.wells[run]), len(self.cycles[run])
+        return Plate(self.data[run,:nWells,:nCycles],self.wells[run],cycles=self.cycles[run],
+                    dyes=self.dyes[run],name=self.names[run])
+
+    def select(self,wells=None,runs=None,dyes=None):
+        '''
+        Plate of the matching wells across runs, e.g. the same well in every run,
+        and the run of each of its rows. Cycles are those of the longest run.
+        '''
+        runList, rowList = self.rows(wells,runs,dyes)
+        used = set(runList.tolist())
+        cycles = max([self.cycles[r] for r in used],key=len) if used else np.zeros(0)
+        plate = Plate(self.fluorescence(runList,rowList)[:,:len(cycles)],
+                    [self.wells[r][i] for r,i in zip(runList,rowList)],cycles=cycles,
+                    dyes=[self.dyes[r][i] for r,i in zip(runList,rowList)])
+        return plate, runList
+
+    def flatPlate(self):
+        '''
+        Every run as one plate of runs*wells rows over a view of the session
+        array. Row run*wells + i is well i of that run, padding rows have no name.
+        The plate has no name of its own, runPlates splits it back into runs.
+        '''
+        nRuns, nWells, nCycles = len(self), self.data.shape[1], self.data.shape[2]
+        wells = np.full((nRuns,nWells),"",dtype=object)
+        dyes = np.full((nRuns,nWells),"",dtype=object)
+        cycles = np.arange(1,nCycles+1,dtype=float)
+        for run in range(nRuns):
+            wells[run,:len(self.wells[run])] = self.wells[run]
+            dyes[run,:len(self.dyes[run])] = self.dyes[run]
+            if len(self.cycles[run]) == nCycles:
+                cycles = self.cycles[run]
+        return Plate(self.data[:nRuns].reshape(nRuns*nWells,nCycles),wells.ravel(),cycles=cycles,
+                    dyes=dyes.ravel())
+
+    def flatRow(self,run,row):
+        return run*self.data.shape[1] + row
+
+    def runPlates(self,plate,rows=None):
+        '''
+        Rows (all if None) of a plate laid out like flatPlate, e.g. after baseline
+        subtraction, split back into one plate per run named after that run
+        '''
+        nWells = self.data.shape[1]
+        rows = np.arange(len(plate)) if rows is None else np.asarray(rows,dtype=int)
+        rows = rows[plate.wells[rows] != ""]
+        plates = []
+        for run in np.unique(rows//nWells).tolist():
+            runRows = rows[rows//nWells == run]
+            nCycles = len(self.cycles[run])
+            plates.append(Plate(plate.fluorescence[runRows,:nCycles],plate.wells[runRows],cycles=self.cycles[run],
+                                dyes=plate.dyes[runRows],name=self.names[run]))
+        return plates
+
+    def writeIndex(self):
+        '''
+        Saves the run names, wells, dyes and cycles next to the array
+        '''
+        nWells, nCycles = self.data.shape[1], self.data.shape[2]
+        wells = np.full((len(self),nWells),"",dtype=object)
+        dyes = np.full((len(self),nWells),"",dtype=object)
+        cycles = np.full((len(self),nCycles),np.nan)
+        for run in range(len(self)):
+            wells[run,:len(self.wells[run])] = self.wells[run]
+            dyes[run,:len(self.dyes[run])] = self.dyes[run]
+            cycles[run,:len(self.cycles[run])] = self.cycles[run]
+        f = open(self.path+".npz.tmp","wb")
+        np.savez(f,names=np.asarray(self.names,dtype=str),wells=wells.astype(str),dyes=dyes.astype(str),cycles=cycles,
+                nWells=np.asarray([len(w) for w in self.wells],dtype=int),
+                nCycles=np.asarray([len(c) for c in self.cycles],dtype=int))
+        f.close()
+        os.replace(self.path+".npz.tmp",self.path+".npz")
+
+    def load(self):
+        '''
+        Reopens a session saved at path, mapping the array rather than reading it
+        '''
+        self.data = np.load(self.path+".npy",mmap_mode="r+")
+        meta = np.load(self.path+".npz")
+        self.names = meta["names"].tolist()
+        for run in range(len(self.names)):
+            self.wells.append(meta["wells"][run,:meta["nWells"][run]])
+            self.dyes.append(meta["dyes"][run,:meta["nWells"][run]])
+            self.cycles.append(meta["cycles"][run,:meta["nCycles"][run]])
+            self.indexRun(run)
+        meta.close()
@@ -0,0 +1,185 @@
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from QPCRPlate import standardCurves
+
+def replicateMeans(cts):
+    '''
+    Mean over the replicate axis (-2) of a (...,replicates,dilutions) array,
+    leaving out NaN (missing or rejected wells)
+    '''
+    cts = np.asarray(cts,dtype=float)
+    valid = np.isfinite(cts)
+    if valid.all():
+        return np.mean(cts,axis=-2)
+    with np.errstate(invalid='ignore',divide='ignore'):
+        return np.where(valid,cts,0.0).sum(axis=-2)/valid.sum(axis=-2)
+
+def meanStdErr(values,axis=-1):
+    '''
+    Mean and standard error (from the ddof=1 deviation) along axis, leaving out NaN
+    '''
+    values = np.asarray(values,dtype=float)
+    valid = np.isfinite(values)
+    n = valid.sum(axis=axis)
+    x = np.where(valid,values,0.0)
+    with np.errstate(invalid='ignore',divide='ignore'):
+        means = x.sum(axis=axis)/n
+        deviations = np.where(valid,values - np.expand_dims(means,axis),0.0)
+        stdErrs = np.sqrt((deviations*deviations).sum(axis=axis)/(n - 1)/n)
+    return means, stdErrs
+
+def efficiencies(cts,concentrations):
+    '''
+    Efficiency 10**(-1/slope) - 1 of the standard curve through the replicate mean
+    cts. cts has shape (...,replicates,dilutions), the result has shape (...)
+    '''
+    slopes = standardCurves(replicateMeans(cts),concentrations)[0]
+    with np.errstate(divide='ignore',invalid='ignore'):
+        return 10**(-1.0/slopes) - 1
+
+def cPeriods(oriCts,terCts,concentrations,tau):
+    '''
+    C period tau*log2((1+a_ter)**ct_ter/(1+a_ori)**ct_ori) at every dilution from
+    replicate mean cts, worked in logs so large cts cannot overflow. tau is a
+    number or an array of doubling times broadcasting against the leading (...)
+    shape, e.g. one per condition. Returns the ori and ter efficiencies and the
+    C periods of shape (...,dilutions)
+    '''
+    oriMeans = replicateMeans(oriCts)
+    terMeans = replicateMeans(terCts)
+    aOri = efficiencies(oriCts,concentrations)
+    aTer = efficiencies(terCts,concentrations)
+    tau = np.asarray(tau,dtype=float)[...,None]
+    with np.errstate(invalid='ignore'):
+        cs = tau*(terMeans*np.log2(1+aTer)[...,None] - oriMeans*np.log2(1+aOri)[...,None])
+    return aOri, aTer, cs
+
+def conditionCPeriods(oriCts,terCts,concentrations,taus):
+    '''
+    C periods of any number of conditions at once. oriCts and terCts are
+    conditions x samples x replicates x dilutions arrays, NaN where a condition
+    has fewer samples or wells were rejected, and taus holds each condition's
+    doubling time. Returns the ori and ter efficiencies (conditions x samples),
+    the C periods (conditions x samples x dilutions) and the mean C period of
+    each condition with its standard error over all its samples and dilutions.
+    '''
+    aOri, aTer, cs = cPeriods(oriCts,terCts,concentrations,np.asarray(taus,dtype=float)[:,None])
+    means, stdErrs = meanStdErr(cs.reshape(cs.shape[0],-1))
+    return aOri, aTer, cs, means, stdErrs
+
+def resample(cts,indexes):
+    '''
+    Replicate resampled cts. indexes has shape (resamples,)+cts.shape and picks
+    replicates independently at each dilution
+    '''
+    cts = np.asarray(cts,dtype=float)
+    return np.take_along_axis(np.broadcast_to(cts,indexes.shape),indexes,axis=-2)
+
+def bootstrapChunk(oriCts,terCts,concentrations,tau,nResamples,seed):
+    '''
+    Efficiencies and mean C periods of nResamples bootstrap resamples drawn from
+    the seed (an int or numpy SeedSequence)
+    '''
+    rng = np.random.default_rng(seed)
+    oriCts = np.asarray(oriCts,dtype=float)
+    terCts = np.asarray(terCts,dtype=float)
+    oriIndexes = rng.integers(0,oriCts.shape[-2],size=(nResamples,)+oriCts.shape)
+    terIndexes = rng.integers(0,terCts.shape[-2],size=(nResamples,)+terCts.shape)
+    aOri, aTer, cs = cPeriods(resample(oriCts,oriIndexes),resample(terCts,terIndexes),concentrations,tau)
+    return aOri, aTer, meanStdErr(cs)[0]
+
+def bootstrap(oriCts,terCts,concentrations,tau,nResamples=10000,seed=None,workers=1,chunkSize=2**15):
+    '''
+    Bootstrap of the ori and ter efficiencies and the mean C period. oriCts and
+    terCts are (...,replicates,dilutions) arrays whose replicate wells are
+    resampled independently at each dilution (see jackknife for the contrast)
+    as index arrays, every resample of a chunk is evaluated at once.
+    Chunks draw from child seeds of one SeedSequence so the result does not
+    depend on workers, which shards the chunks over a process pool if > 1.
+    tau may hold one doubling time per condition as in cPeriods, and NaN wells
+    (missing or rejected) are left out of every mean.
+    Returns arrays of shape (nResamples,...) for aOri, aTer and C period.
+    '''
+    sizes = [min(chunkSize,nResamples-start) for start in range(0,nResamples,chunkSize)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    n = len(sizes)
+    args = ([oriCts]*n,[terCts]*n,[concentrations]*n,[tau]*n,sizes,seeds)
+    if workers is None or workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(bootstrapChunk,*args))
+    else:
+        results = list(map(bootstrapChunk,*args))
+    return tuple(np.concatenate(r) for r in zip(*results))
+
+def jackknifeIndexes(n):
+    '''
+    n x (n-1) array whose row i holds every index except i
+    '''
+    j = np.arange(n-1)[None,:]
+    return j + (j >= np.arange(n)[:,None])
+
+def jackknife(oriCts,terCts,concentrations,tau):
+    '''
+    Delete one replicate jackknife standard errors of the ori and ter efficiencies
+    and the mean C period. Ori and ter replicates are separate wells so the
+    variances from leaving out each of their replicates add. Unlike bootstrap,
+    which resamples the replicates of each dilution independently, the unit
+    left out here is a whole replicate row, the same replicate index at every
+    dilution, so the two spreads are not directly comparable.
+    '''
+    oriCts = np.asarray(oriCts,dtype=float)
+    terCts = np.asarray(terCts,dtype=float)
+    variances = 0
+    for dropped, other, isOri in ((oriCts,terCts,True),(terCts,oriCts,False)):
+        n = dropped.shape[-2]
+        #Leave one out replicates moved to the front: (n,...,replicates-1,dilutions)
+        left = np.moveaxis(dropped[...,jackknifeIndexes(n),:],-3,0)
+        if isOri:
+            aOri, aTer, cs = cPeriods(left,other,concentrations,tau)
+        else:
+            aOri, aTer, cs = cPeriods(other,left,concentrations,tau)
+        estimates = np.stack(np.broadcast_arrays(aOri,aTer,np.mean(cs,axis=-1)))
+        variances = variances + (n-1.0)/n*np.sum((estimates - estimates.mean(axis=1,keepdims=True))**2,axis=1)
+    return tuple(np.sqrt(variances))
+
+def confidenceInterval(samples,level=0.95):
+    '''
+    Percentile interval of bootstrap samples along the first axis
+    '''
+    tail = 50*(1-level)
+    return np.nanpercentile(samples,[tail,100-tail],axis=0)
+
+def rejectOutliers(cts,threshold=0.03,minKept=2):
+    '''
+    Greedy replicate outlier rejection along the first axis of cts, e.g. a
+    replicates x dilutions x runs array with NaN for missing wells. While a
+    column's sample standard deviation is above threshold and it has more than
+    minKept replicates, the replicate whose removal lowers it most is dropped.
+    Every leave one out deviation is worked out at once from the column sums.
+    Returns the mask of kept replicates.
+    '''
+    cts = np.asarray(cts,dtype=float)
+    kept = np.isfinite(cts)
+    #Centred on the column means so the sums of squares keep their precision
+    with np.errstate(invalid='ignore',divide='ignore'):
+        x = np.where(kept,cts - np.nanmean(np.where(kept,cts,np.nan),axis=0),0.0)
+    for step in range(cts.shape[0]):
+        n = kept.sum(axis=0)
+        s1 = np.where(kept,x,0.0).sum(axis=0)
+        s2 = np.where(kept,x*x,0.0).sum(axis=0)
+        with np.errstate(invalid='ignore',divide='ignore'):
+            std = np.sqrt(np.maximum(s2 - s1*s1/n,0.0)/(n - 1))
+            looS1 = s1 - x
+            looStd = np.sqrt(np.maximum(s2 - x*x - looS1*looS1/(n - 1),0.0)/(n - 2))
+        looStd = np.where(kept,looStd,np.inf)
+        #Removals leaving deviations within 1e-9 (relative) of the lowest count as
+        #ties and drop the first such replicate. The running sums round differently
+        #from a per subset std, so exact ties are not settled the way a strict <
+        #loop over the replicates would settle them.
+        lowest = looStd.min(axis=0)
+        best = np.argmax(looStd <= lowest*(1 + 1e-9),axis=0)
+        drop = (std > threshold) & (n > minKept) & (lowest < std)
+        if not drop.any():
+            break
+        np.put_along_axis(kept,best[None],np.take_along_axis(kept,best[None],axis=0) & ~drop[None],axis=0)
+    return kept
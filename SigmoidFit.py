@@ -0,0 +1,130 @@
+import numpy as np
+
+#Parameters of each model, in the order of the parameter arrays
+parameterNames = {"logistic":["Fmax","x0","b"],
+                  "4PL":["Fmax","x0","b","Fb"],
+                  "5PL":["Fmax","x0","b","Fb","g"]}
+
+def sigmoid(cycles,params,model="4PL"):
+    '''
+    Fb + Fmax/(1 + exp(-(x - x0)/b))**g for each row of params, with Fb = 0
+    for the logistic and g = 1 for the logistic and 4PL models
+    '''
+    return sigmoidJacobian(cycles,params,model)[0]
+
+def sigmoidJacobian(cycles,params,model="4PL"):
+    '''
+    Model values (curves x cycles) and their analytic derivatives with respect
+    to every parameter (curves x cycles x parameters)
+    '''
+    params = np.atleast_2d(np.asarray(params,dtype=float))
+    x = np.asarray(cycles,dtype=float)[None,:]
+    fMax, x0, b = params[:,0,None], params[:,1,None], params[:,2,None]
+    fB = params[:,3,None] if model != "logistic" else 0.0
+    g = params[:,4,None] if model == "5PL" else 1.0
+    with np.errstate(over='ignore',divide='ignore',invalid='ignore'):
+        e = np.exp(np.clip(-(x - x0)/b,-700,700))
+        u = 1 + e
+        s = u**(-g)
+        f = fB + fMax*s
+        #Shared part of the x0 and b derivatives
+        ds = -g*fMax*s/u*e/b
+        columns = [s,ds,ds*(x - x0)/b]
+        if model != "logistic":
+            columns.append(np.ones_like(s))
+        if model == "5PL":
+            columns.append(-fMax*s*np.log(u))
+    return f, np.stack(np.broadcast_arrays(*columns),axis=-1)
+
+def initialGuess(cycles,fluorescence,model="4PL"):
+    '''
+    Starting parameters from the baseline, plateau and half height cycle of
+    each curve
+    '''
+    cycles = np.asarray(cycles,dtype=float)
+    ys = np.asarray(fluorescence,dtype=float)
+    fB = np.nanmedian(ys[:,:5],axis=1)
+    fMax = np.nanmax(ys,axis=1) - fB
+    with np.errstate(invalid='ignore'):
+        above = ys > (fB + fMax/2)[:,None]
+    j = np.maximum(above.argmax(axis=1),1)
+    x0 = np.where(above.any(axis=1),cycles[j],cycles[len(cycles)//2])
+    columns = [fMax,x0,np.full(len(ys),1.5)]
+    if model != "logistic":
+        columns.append(fB)
+    if model == "5PL":
+        columns.append(np.ones(len(ys)))
+    return np.stack(columns,axis=1)
+
+def fitSigmoids(cycles,fluorescence,model="4PL",p0=None,maxIterations=200,tolerance=1e-10):
+    '''
+    Levenberg-Marquardt fits of a sigmoid model to every curve (row) at once.
+    The normal equations of all curves are stacked into one curves x params x
+    params system and solved together each iteration, each curve keeping its
+    own damping. Non finite points are left out.
+    Returns parameters, their covariances, the second derivative maximum cycle
+    (Cq), the efficiency at Cq and whether each fit converged.
+    '''
+    cycles = np.asarray(cycles,dtype=float)
+    ys = np.atleast_2d(np.asarray(fluorescence,dtype=float))
+    w = np.isfinite(ys).astype(float)
+    ys = np.where(w > 0,ys,0.0)
+    params = initialGuess(cycles,np.where(w > 0,ys,np.nan),model) if p0 is None else np.array(p0,dtype=float)
+    nCurves, nParams = params.shape
+    damping = np.full(nCurves,1e-3)
+    converged = np.zeros(nCurves,dtype=bool)
+    f, jacobian = sigmoidJacobian(cycles,params,model)
+    sse = np.sum(w*(ys - f)**2,axis=1)
+    diagonal = np.arange(nParams)
+    for iteration in range(maxIterations):
+        active = np.flatnonzero(~converged)
+        if len(active) == 0:
+            break
+        r = w[active]*(ys[active] - f[active])
+        jA = jacobian[active]
+        jtw = np.swapaxes(jA*w[active][...,None],1,2)
+        a = np.matmul(jtw,jA)
+        jtr = np.matmul(jtw,r[...,None])
+        a[:,diagonal,diagonal] *= (1 + damping[active])[:,None]
+        a[:,diagonal,diagonal] += 1e-12
+        with np.errstate(invalid='ignore'):
+            step = np.linalg.solve(a,jtr)[...,0]
+        trial = params[active] + step
+        fTrial, jTrial = sigmoidJacobian(cycles,trial,model)
+        with np.errstate(over='ignore',invalid='ignore'):
+            sseTrial = np.sum(w[active]*(ys[active] - fTrial)**2,axis=1)
+        better = np.isfinite(sseTrial) & (sseTrial <= sse[active])
+        improvement = np.where(better,sse[active] - sseTrial,0.0)
+        #Accepted steps relax the damping, rejected ones stiffen it
+        accepted = active[better]
+        params[accepted] = trial[better]
+        f[accepted] = fTrial[better]
+        jacobian[accepted] = jTrial[better]
+        sse[accepted] = sseTrial[better]
+        #Only trust a stalled decrease once the step is close to Gauss-Newton
+        stalled = better & (improvement <= tolerance*sse[active]) & (damping[active] <= 1e-2)
+        damping[active] = np.where(better,damping[active]/10,damping[active]*10)
+        small = np.all(np.abs(step) <= tolerance*(np.abs(params[active]) + tolerance),axis=1)
+        converged[active] = stalled | small | (damping[active] > 1e16)
+    #Covariance from the final Jacobian and residual variance
+    jtj = np.matmul(np.swapaxes(jacobian*w[...,None],1,2),jacobian)
+    dof = np.maximum(w.sum(axis=1) - nParams,1)
+    with np.errstate(invalid='ignore'):
+        covariances = np.linalg.pinv(jtj)*(sse/dof)[:,None,None]
+    cqs, efficiencies = sigmoidCq(params,model)
+    return params, covariances, cqs, efficiencies, converged
+
+def sigmoidCq(params,model="4PL"):
+    '''
+    Cycle of the second derivative maximum, x0 - b*ln(z) with z the root of
+    g**2 z**2 - (3g + 1) z + 1 = 0 above 1/g, and the efficiency between that
+    cycle and the one before it from the baseline corrected model
+    '''
+    params = np.atleast_2d(params)
+    g = params[:,4] if model == "5PL" else np.ones(len(params))
+    with np.errstate(divide='ignore',invalid='ignore',over='ignore'):
+        z = ((3*g + 1) + np.sqrt((3*g + 1)**2 - 4*g*g))/(2*g*g)
+        cqs = params[:,1] - params[:,2]*np.log(z)
+        #Fmax*(1+z)**-g above baseline at Cq and Fmax*(1+z*exp(1/b))**-g a cycle before
+        efficiencies = ((1 + z*np.exp(1.0/params[:,2]))/(1 + z))**g - 1
+    return cqs, efficiencies
@@ -0,0 +1,73 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+import io
+import glob
+from contextlib import redirect_stderr
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),".."))
+from QPCRBatch import main
+
+dataDirectory = os.path.join(os.path.dirname(os.path.abspath(__file__)),"..","Data","QPCRExperiments_TextFiles")
+
+class TestBatchCache(unittest.TestCase):
+    '''
+    Several worker processes sharing one plate cache directory
+    '''
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cacheDir = os.path.join(self.directory,"cache")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def readOutput(self,name,workers,cacheDir=None,paths=None):
+        outPath = os.path.join(self.directory,name)
+        argv = [paths or dataDirectory,"-t","-2.32","-t","-3","-j",str(workers),"-o",outPath]
+        if cacheDir is not None:
+            argv += ["--cache-dir",cacheDir]
+        main(argv)
+        f = open(outPath)
+        text = f.read()
+        f.close()
+        return text
+
+    def testParallelCache(self):
+        expected = self.readOutput("serial.csv",1)
+        #A cold cache filled by many workers at once, then a warm one
+        for i in range(3):
+            self.assertEqual(self.readOutput("parallel{0}.csv".format(i),8,self.cacheDir),expected)
+        names = os.listdir(self.cacheDir)
+        self.assertFalse([n for n in names if n.endswith(".tmp")])
+        self.assertIn("index.json",names)
+
+    def testMalformedPlate(self):
+        expected = self.readOutput("serial.csv",1)
+        plates = os.path.join(self.directory,"plates")
+        os.mkdir(plates)
+        for filePath in glob.glob(os.path.join(dataDirectory,"*.txt")):
+            shutil.copy(filePath,plates)
+        #A plate with a bad number, sorted among the good ones
+        f = open(sorted(glob.glob(os.path.join(plates,"*.txt")))[0],"rb")
+        text = f.read().decode("utf-16").split("\n")
+        f.close()
+        text[3] = text[3].replace("\t0.","\tbad",1)
+        badPath = os.path.join(plates,"dario_bad.txt")
+        f = open(badPath,"wb")
+        f.write("\n".join(text).encode("utf-16"))
+        f.close()
+        errors = io.StringIO()
+        with redirect_stderr(errors), self.assertRaises(SystemExit) as exit:
+            self.readOutput("partial.csv",4,self.cacheDir,paths=plates)
+        self.assertEqual(exit.exception.code,1)
+        self.assertIn(badPath + ": ValueError",errors.getvalue())
+        self.assertIn("line 4",errors.getvalue())
+        #Every other plate is written, as in a run without the bad one
+        f = open(os.path.join(self.directory,"partial.csv"))
+        self.assertEqual(f.read(),expected)
+        f.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+import numpy as np
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),".."))
+from QPCRFiles import readCtFile, CtSets
+
+oriBlock = "14.82,\t17.01,\t19.42\n14.66,\t17.22,\t19.41\n"
+terBlock = "15.10,\t17.30,\t19.60\n15.02,\t17.41,\t19.55\n"
+
+class TestCtFiles(unittest.TestCase):
+    '''
+    Reading replicate ct csv files and directories of them
+    '''
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self,name,text):
+        filePath = os.path.join(self.directory,name)
+        f = open(filePath,"w")
+        f.write(text)
+        f.close()
+        return filePath
+
+    def testBlankSeparators(self):
+        expected = readCtFile(self.write("M63_1.csv",oriBlock + "\n" + terBlock))
+        self.assertEqual(expected.shape,(2,2,3))
+        #Separator lines of spaces or tabs still split the blocks
+        for separator in ("  \n","\t\n"," \r\n"):
+            cts = readCtFile(self.write("M63_1.csv",oriBlock + separator + terBlock))
+            np.testing.assert_array_equal(cts,expected)
+
+    def testBadNumberLine(self):
+        filePath = self.write("M63_1.csv",oriBlock + "\n" + terBlock.replace("17.41","x"))
+        with self.assertRaisesRegex(ValueError,"line 5"):
+            readCtFile(filePath)
+
+    def testRemovedFiles(self):
+        self.write("M63_1.csv",oriBlock + "\n" + terBlock)
+        removed = self.write("M63_2.csv",oriBlock + "\n" + terBlock)
+        sets = CtSets(self.directory)
+        self.assertEqual(sets.samples,[["1","2"]])
+        os.remove(removed)
+        sets.load(self.directory)
+        self.assertEqual(sets.samples,[["1"]])
+        self.assertEqual(sets.cts.shape[:2],(1,1))
+
+    def testBadFileKeepsSet(self):
+        self.write("M63_1.csv",oriBlock + "\n" + terBlock)
+        sets = CtSets(self.directory)
+        cts = sets.cts
+        self.write("M63_2.csv",oriBlock)
+        with self.assertRaises(ValueError):
+            sets.load(self.directory)
+        self.assertEqual(sets.conditions,["M63"])
+        self.assertEqual(sets.samples,[["1"]])
+        self.assertIs(sets.cts,cts)
+
+if __name__ == '__main__':
+    unittest.main()